@@ -0,0 +1,27 @@
+"""
+Benchmarks for Laggron's Dumb Cogs.
+
+The cogs are driven with in-memory stand-ins for Discord objects, an in-memory Config driver
+and a fake HTTP layer adding a simulated latency to each API call, so no bot or connection is
+needed. Red and discord.py must still be installed, the cogs import them.
+
+Run all scenarios from the root of the repository:
+
+.. code-block:: none
+
+    python -m benchmarks
+
+Type ``python -m benchmarks --help`` for the options.
+
+The event storm scenarios (``warnsystem.warn_storm``, ``roleinvite.member_join_flood``,
+``say.interact_flood`` and ``instantcmd.listener_flood``) send events at ``--rate`` per
+second, and ``--rate-limits`` makes a part of the HTTP requests answered with a 429.
+
+Save the results of two commits and compare them:
+
+.. code-block:: none
+
+    python -m benchmarks --json before.json
+    python -m benchmarks --json after.json
+    python -m benchmarks --compare before.json after.json
+"""
@@ -0,0 +1,116 @@
+import argparse
+import asyncio
+import json
+import sys
+
+from .runner import compare_reports, format_report
+
+
+def get_scenarios() -> dict:
+    from . import bench_instantcmd, bench_roleinvite, bench_say, bench_startup, bench_warnsystem
+
+    scenarios = {}
+    scenarios.update(bench_warnsystem.SCENARIOS)
+    scenarios.update(bench_roleinvite.SCENARIOS)
+    scenarios.update(bench_say.SCENARIOS)
+    scenarios.update(bench_instantcmd.SCENARIOS)
+    scenarios.update(bench_startup.SCENARIOS)
+    return scenarios
+
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks", description="Run the benchmarks of Laggron's Dumb Cogs."
+    )
+    parser.add_argument(
+        "scenarios",
+        nargs="*",
+        help="Names or prefixes of the scenarios to run (e.g. warnsystem). Runs all by default.",
+    )
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=0.05,
+        help="Average simulated latency of an HTTP request, in seconds. 0 disables it.",
+    )
+    parser.add_argument(
+        "--jitter", type=float, default=0.2, help="Latency variation, as a fraction of it."
+    )
+    parser.add_argument(
+        "--scale", type=float, default=1.0, help="Multiply the size of each scenario."
+    )
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=200,
+        help="Events per second sent by the event storm scenarios. 0 sends them all at once.",
+    )
+    parser.add_argument(
+        "--rate-limits",
+        type=float,
+        default=0.0,
+        help="Fraction of the HTTP requests answered with a 429 (e.g. 0.05).",
+    )
+    parser.add_argument(
+        "--retry-after",
+        type=float,
+        default=0.5,
+        help="Time to wait after a 429 before retrying the request, in seconds.",
+    )
+    parser.add_argument(
+        "--no-serialize",
+        dest="serialize",
+        action="store_false",
+        help="Don't reproduce the cost of the JSON driver dumping its data on each write.",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the random values.")
+    parser.add_argument("--json", metavar="PATH", help="Also write the results to a JSON file.")
+    parser.add_argument(
+        "--compare",
+        nargs=2,
+        metavar=("OLD", "NEW"),
+        help="Compare two JSON files written with --json instead of running the scenarios.",
+    )
+    parser.add_argument("--list", action="store_true", help="List the scenarios and exit.")
+    return parser.parse_args(args)
+
+
+async def run(options, scenarios: dict) -> list:
+    results = []
+    for name, scenario in scenarios.items():
+        print(f"Running {name}...", file=sys.stderr)
+        results.append(await scenario(options))
+    return results
+
+
+def main(args=None):
+    options = parse_args(sys.argv[1:] if args is None else args)
+    if options.compare:
+        reports = []
+        for path in options.compare:
+            with open(path) as file:
+                reports.append(json.load(file))
+        print(compare_reports(*reports))
+        return
+    scenarios = get_scenarios()
+    if options.list:
+        for name, scenario in scenarios.items():
+            print(f"{name}: {scenario.__doc__.strip()}")
+        return
+    if options.scenarios:
+        scenarios = {
+            x: y for x, y in scenarios.items() if any(x.startswith(z) for z in options.scenarios)
+        }
+        if not scenarios:
+            sys.exit("No scenario matches the given names.")
+    loop = asyncio.get_event_loop()
+    results = loop.run_until_complete(run(options, scenarios))
+    print(format_report(results))
+    if options.json:
+        data = {"options": vars(options), "results": [x.to_dict() for x in results]}
+        with open(options.json, "w") as file:
+            json.dump(data, file, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+InstantCommands scenarios.
+"""
+
+import asyncio
+import random
+
+from instantcmd.instantcmd import InstantCommands
+
+from .config import make_config, patch_config
+from .fakes import FakeBot, FakeHTTP, FakeMessage, make_guild
+from .runner import Result, measure_stream
+
+PING_LISTENER = """
+async def on_message(message):
+    if message.content == "ping":
+        await message.channel.send("pong")
+
+return on_message
+"""
+
+
+async def setup(options, listeners: dict):
+    """Create a bot, a guild and the InstantCommands cog with the given listeners loaded."""
+    http = FakeHTTP.from_options(options)
+    bot = FakeBot(http)
+    guild = make_guild(bot, members=100)
+    config = make_config("InstantCommands", serialize=options.serialize)
+    with patch_config(config):
+        cog = InstantCommands(bot)
+    cog._set_log(None)
+    await asyncio.sleep(0)  # let the cog resume its (empty) list of commands
+    await config.commands.set(listeners)
+    await cog.resume_commands()
+    return bot, guild, cog
+
+
+async def listener_flood(options) -> Result:
+    """Messages at --rate per second going through an on_message listener, half answered."""
+    rng = random.Random(options.seed)
+    bot, guild, cog = await setup(options, {"on_message": PING_LISTENER})
+    members = [x for x in guild.members if not x.bot]
+    bot.http.calls.clear()
+
+    async def operation(i):
+        content = "ping" if i % 2 else "hello"
+        message = FakeMessage(rng.choice(guild.text_channels), rng.choice(members), content)
+        await asyncio.gather(*bot.dispatch("message", message))
+
+    result = await measure_stream(
+        "instantcmd.listener_flood", operation, int(1000 * options.scale), options.rate
+    )
+    result.extra = {
+        "http": sum(bot.http.calls.values()),
+        "rate_limited": bot.http.rate_limited,
+        "listeners": len(bot.listeners),
+    }
+    return result
+
+
+SCENARIOS = {"instantcmd.listener_flood": listener_flood}
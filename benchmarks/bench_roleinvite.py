@@ -0,0 +1,139 @@
+"""
+RoleInvite scenarios.
+"""
+
+import asyncio
+import random
+import time
+
+from roleinvite.roleinvite import RoleInvite
+
+from .config import make_config, patch_config
+from .fakes import FakeBot, FakeHTTP, make_guild
+from .runner import Result, measure_stream
+
+
+async def setup(options, invites: int = 20):
+    """
+    Create a bot, a guild and the RoleInvite cog, enabled with invites linked to a role each
+    and main roles.
+
+    Returns the bot, the guild, the cog, the in-memory driver and a :py:class:`dict` mapping
+    the invites to their role, ``"main"`` included.
+    """
+    http = FakeHTTP.from_options(options)
+    bot = FakeBot(http)
+    guild = make_guild(bot, members=50)
+    config = make_config("RoleInvite", serialize=options.serialize)
+    driver = config.driver  # the cog wraps it
+    with patch_config(config):
+        cog = RoleInvite(bot)
+    cog._set_log(None)
+    roles = {"main": guild.add_role("Main", 4)}
+    data = {"main": {"roles": [roles["main"].id]}}
+    for i in range(invites):
+        role = guild.add_role(f"Invite {i}", 4)
+        invite = await guild.text_channels[i % len(guild.text_channels)].create_invite()
+        roles[invite] = role
+        data[invite.code] = {"roles": [role.id], "uses": 0}
+    await config.guild(guild).invites.set(data)
+    await config.guild(guild).enabled.set(True)
+    await cog.api.update_invites()
+    await cog.data.driver.flush()  # the writes are delayed
+    return bot, guild, cog, driver, roles
+
+
+def counters(bot: FakeBot, driver) -> dict:
+    return {
+        "http": sum(bot.http.calls.values()),
+        "config_reads": driver.reads,
+        "config_writes": driver.writes,
+        "rate_limited": bot.http.rate_limited,
+    }
+
+
+def reset_counters(bot: FakeBot, driver):
+    bot.http.calls.clear()
+    bot.http.rate_limited = 0
+    driver.reads = 0
+    driver.writes = 0
+
+
+async def member_join_flood(options) -> Result:
+    """Members joining at --rate per second with one of 20 tracked invites."""
+    rng = random.Random(options.seed)
+    bot, guild, cog, driver, roles = await setup(options)
+    invites = [x for x in roles if x != "main"]
+    joins = [
+        (bot.add_user(f"joined-{i}"), rng.choice(invites)) for i in range(int(300 * options.scale))
+    ]
+    members = []
+    reset_counters(bot, driver)
+
+    async def operation(i):
+        user, invite = joins[i]
+        # Discord counts the use before sending the event
+        invite.uses += 1
+        member = guild.add_member(user)
+        members.append((member, roles[invite]))
+        await cog.on_member_join(member)
+
+    result = await measure_stream(
+        "roleinvite.member_join_flood", operation, len(joins), options.rate
+    )
+    await cog.data.driver.flush()
+    result.extra = counters(bot, driver)
+    # members who got the main roles because their invite couldn't be told
+    ambiguous = [x for x, y in members if roles["main"] in x.roles]
+    result.extra["ambiguous"] = len(ambiguous)
+    # members who got the role of another invite
+    result.extra["misattributed"] = sum(
+        1 for x, y in members if x not in ambiguous and y not in x.roles
+    )
+    return result
+
+
+async def startup(options) -> Result:
+    """
+    Update the invites of 200 guilds on load, each with 5 linked invites. The duration of an
+    operation is the time until a guild is ready to attribute joins.
+    """
+    http = FakeHTTP.from_options(options)
+    bot = FakeBot(http)
+    config = make_config("RoleInvite", serialize=options.serialize)
+    driver = config.driver
+    with patch_config(config):
+        cog = RoleInvite(bot)
+    cog._set_log(None)
+    await asyncio.sleep(0)  # let the cog update its (empty) list of guilds
+    guilds = []
+    for i in range(int(200 * options.scale)):
+        guild = make_guild(bot, members=5, channels=1, name=f"Guild {i}")
+        role = guild.add_role("Invite", 4)
+        data = {}
+        for _ in range(5):
+            invite = await guild.text_channels[0].create_invite()
+            invite.uses = 3
+            data[invite.code] = {"roles": [role.id], "uses": 0}
+        await config.guild(guild).invites.set(data)
+        await config.guild(guild).enabled.set(True)
+        guilds.append(guild)
+    await cog.data.driver.flush()
+    reset_counters(bot, driver)
+    cog.api.ready.clear()
+    cog.api.loaded.clear()
+
+    start = time.perf_counter()
+    task = asyncio.ensure_future(cog.api.update_invites())
+    durations = []
+    for guild in guilds:
+        await cog.api.wait_until_ready(guild)
+        durations.append(time.perf_counter() - start)
+    await task
+    result = Result("roleinvite.startup", durations, time.perf_counter() - start)
+    await cog.data.driver.flush()
+    result.extra = counters(bot, driver)
+    return result
+
+
+SCENARIOS = {"roleinvite.member_join_flood": member_join_flood, "roleinvite.startup": startup}
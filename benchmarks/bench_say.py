@@ -0,0 +1,105 @@
+"""
+Say scenarios.
+"""
+
+import asyncio
+import random
+import tempfile
+import types
+
+from pathlib import Path
+from unittest import mock
+
+from say.say import Say
+
+from .config import make_config, patch_config
+from .fakes import FakeBot, FakeHTTP, FakeMessage, make_guild
+from .runner import Result, measure_stream
+
+
+async def setup(options, path: Path):
+    """Create a bot, a guild and the Say cog, with its cache in the given folder."""
+    http = FakeHTTP.from_options(options)
+    bot = FakeBot(http)
+    guild = make_guild(bot, members=100)
+    config = make_config("Say", serialize=options.serialize)
+    with patch_config(config), mock.patch("say.say.cog_data_path", return_value=path):
+        cog = Say(bot)
+    cog._set_log(None)
+    return bot, guild, cog
+
+
+def watch_deliveries(channel) -> dict:
+    """
+    Resolve the futures of the returned :py:class:`dict`, keyed by content, when a message
+    with that content is sent in the channel.
+    """
+    pending = {}
+    send = channel.send
+
+    async def watched_send(content=None, **kwargs):
+        message = await send(content, **kwargs)
+        future = pending.pop(content, None)
+        if future is not None and not future.done():
+            future.set_result(None)
+        return message
+
+    channel.send = watched_send
+    return pending
+
+
+async def interact_flood(options) -> Result:
+    """
+    DM messages of 10 [p]interact sessions at --rate per second, each followed by a message
+    in a watched channel.
+    """
+    rng = random.Random(options.seed)
+    with tempfile.TemporaryDirectory() as path:
+        bot, guild, cog = await setup(options, Path(path))
+        channels = guild.text_channels
+        deliveries = {x: watch_deliveries(x) for x in channels}
+        members = [x for x in guild.members if not x.bot and x != guild.owner]
+        sessions = []
+        for i in range(max(1, int(10 * options.scale))):
+            user = members[i]._user
+            channel = channels[i % len(channels)]
+            ctx = types.SimpleNamespace(author=user, channel=channel, send=user.send)
+            sessions.append((user, channel))
+            bot.loop.create_task(Say._interact.callback(cog, ctx, channel))
+        await asyncio.sleep(0.1)  # let the sessions start
+        others = members[len(sessions) :]
+        timeout = max(1, options.latency * 20)
+        lost = 0
+
+        async def operation(i):
+            nonlocal lost
+            user, channel = sessions[i % len(sessions)]
+            content = f"Flood message {i}"
+            future = bot.loop.create_future()
+            deliveries[channel][content] = future
+            bot.dispatch("message", FakeMessage(user.dm_channel, user, content))
+            # messages from the server are sent to the sessions watching the channel
+            noise = FakeMessage(rng.choice(channels), rng.choice(others), "Hello there")
+            bot.dispatch("message", noise)
+            try:
+                await asyncio.wait_for(future, timeout)
+            except asyncio.TimeoutError:
+                deliveries[channel].pop(content, None)
+                lost += 1
+
+        result = await measure_stream(
+            "say.interact_flood", operation, int(300 * options.scale), options.rate
+        )
+        for user, channel in sessions:
+            await cog.stop_interaction(user)
+        bot.dispatch("message", FakeMessage(channels[0], others[0], "End"))
+        await asyncio.sleep(0)
+    result.extra = {
+        "http": sum(bot.http.calls.values()),
+        "rate_limited": bot.http.rate_limited,
+        "lost": lost,
+    }
+    return result
+
+
+SCENARIOS = {"say.interact_flood": interact_flood}
@@ -0,0 +1,81 @@
+"""
+Cog load scenarios.
+
+Each load runs in a new interpreter, so the modules imported by a previous load don't hide
+the cost of the next one.
+"""
+
+import asyncio
+import json
+import sys
+import tempfile
+
+from .runner import Result
+
+COGS = {
+    "warnsystem": "WarnSystem",
+    "roleinvite": "RoleInvite",
+    "instantcmd": "InstantCommands",
+    "say": "Say",
+}
+
+# Red and discord.py are already loaded when a cog is loaded, only the cog itself is measured
+LOAD_SCRIPT = """
+import json
+import sys
+import time
+import types
+
+import discord
+from redbot.core import bot, commands, data_manager
+
+data_manager.basic_config = {{
+    "DATA_PATH": sys.argv[1], "COG_PATH_APPEND": "cogs", "CORE_PATH_APPEND": "core"
+}}
+red = types.SimpleNamespace(
+    owner_id=1, user=types.SimpleNamespace(id=1), get_user=lambda x: None
+)
+modules = len(sys.modules)
+start = time.perf_counter()
+import {module}
+sentry = {module}.Log(red, {module}.{cog}.__version__)
+sentry.enable_stdout()
+duration = time.perf_counter() - start
+print(json.dumps({{"duration": duration, "modules": len(sys.modules) - modules}}))
+"""
+
+
+async def load(module: str, cog: str, path: str) -> dict:
+    process = await asyncio.create_subprocess_exec(
+        sys.executable,
+        "-c",
+        LOAD_SCRIPT.format(module=module, cog=cog),
+        path,
+        stdout=asyncio.subprocess.PIPE,
+    )
+    stdout, _ = await process.communicate()
+    if process.returncode:
+        raise RuntimeError(f"Loading {module} failed.")
+    return json.loads(stdout.decode())
+
+
+async def cog_load(options) -> Result:
+    """Import each cog and create its logger with error reporting disabled."""
+    count = max(1, int(5 * options.scale))
+    durations = []
+    modules = 0
+    with tempfile.TemporaryDirectory() as path:
+        for i in range(count):
+            for module, cog in COGS.items():
+                data = await load(module, cog, path)
+                durations.append(data["duration"])
+                modules += data["modules"]
+    return Result(
+        "startup.cog_load",
+        durations,
+        sum(durations),
+        {"modules_per_load": modules // len(durations)},
+    )
+
+
+SCENARIOS = {"startup.cog_load": cog_load}
@@ -0,0 +1,264 @@
+"""
+WarnSystem scenarios.
+"""
+
+import random
+import tempfile
+
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from laggron_utils.cache import CachedDriver
+from warnsystem import metrics
+from warnsystem.api import API
+from warnsystem.archive import CaseArchive
+from warnsystem.warnsystem import WarnSystem
+
+from .config import MemoryDriver, make_config
+from .fakes import FakeBot, FakeHTTP, make_guild
+from .runner import Result, measure_concurrent, measure_sequential, measure_stream
+
+TIME_FORMAT = "%a %d %B %Y %H:%M:%S"
+
+
+async def setup(options, members: int = 500):
+    """
+    Create a bot, a guild and the WarnSystem API with its modlog channel and mute role.
+
+    The config driver is wrapped like in the cog, see :func:`storage` for the in-memory one.
+    """
+    http = FakeHTTP.from_options(options)
+    bot = FakeBot(http)
+    guild = make_guild(bot, members=members)
+    config = make_config("WarnSystem", serialize=options.serialize)
+    config.register_global(**WarnSystem.default_global)
+    config.register_guild(**WarnSystem.default_guild)
+    config.register_custom("MODLOGS", **WarnSystem.default_custom_member)
+    api = API(bot, config)
+    config.driver = CachedDriver(metrics.CountingDriver(config.driver, api.metrics))
+    await config.guild(guild).channels.main.set(guild.text_channels[0].id)
+    mute_role = [x for x in guild.roles if x.name == "Muted"][0]
+    await config.guild(guild).mute_role.set(mute_role.id)
+    return bot, guild, api
+
+
+def storage(api: API) -> MemoryDriver:
+    """The in-memory driver, under the cache and the metrics of the cog."""
+    return api.data.driver.driver.driver
+
+
+def seed_cases(api: API, guild, total: int, rng: random.Random):
+    """Write ``total`` old cases spread over the guild's members, directly in the driver."""
+    driver = storage(api)
+    members = [x for x in guild.members if not x.bot and x != guild.owner]
+    author = guild.owner.id
+    now = datetime.now()
+    logs = {}
+    for i in range(total):
+        member = members[i % len(members)]
+        time = now - timedelta(days=730) + timedelta(seconds=i * 63072000 // total)
+        logs.setdefault(str(member.id), {"x": []})["x"].append(
+            {
+                "level": rng.randint(1, 5),
+                "author": author,
+                "reason": f"Benchmark case {i}",
+                "time": time.strftime(TIME_FORMAT),
+                "duration": None,
+                "until": None,
+            }
+        )
+    driver.data.setdefault(driver.unique_cog_identifier, {}).setdefault("MODLOGS", {})[
+        str(guild.id)
+    ] = logs
+    api.data.driver.invalidate()  # written behind the cache
+
+
+def counters(bot: FakeBot, api: API) -> dict:
+    return {
+        "http": sum(bot.http.calls.values()),
+        "config_reads": storage(api).reads,
+        "config_writes": storage(api).writes,
+        "rate_limited": bot.http.rate_limited,
+    }
+
+
+def reset_counters(bot: FakeBot, api: API):
+    bot.http.calls.clear()
+    bot.http.rate_limited = 0
+    storage(api).reads = 0
+    storage(api).writes = 0
+
+
+def _members(guild):
+    return [x for x in guild.members if not x.bot and x != guild.owner]
+
+
+async def warn(options) -> Result:
+    """Level 1 warnings, one after the other, on a guild with 10k cases."""
+    rng = random.Random(options.seed)
+    bot, guild, api = await setup(options)
+    seed_cases(api, guild, int(10000 * options.scale), rng)
+    members = _members(guild)
+    reset_counters(bot, api)
+
+    async def operation(i):
+        await api.warn(guild, rng.choice(members), guild.owner, 1, f"Benchmark warn {i}")
+
+    result = await measure_sequential("warnsystem.warn", operation, int(200 * options.scale))
+    result.extra = counters(bot, api)
+    return result
+
+
+async def warn_archived(options) -> Result:
+    """Same as warn, with cases older than 30 days moved to the archive."""
+    rng = random.Random(options.seed)
+    bot, guild, api = await setup(options)
+    seed_cases(api, guild, int(10000 * options.scale), rng)
+    members = _members(guild)
+    with tempfile.TemporaryDirectory() as path:
+        api.archive = CaseArchive(bot, Path(path))
+        await api.data.guild(guild).archive_after.set(30)
+        await api.archive_cases(guild)
+        reset_counters(bot, api)
+
+        async def operation(i):
+            await api.warn(guild, rng.choice(members), guild.owner, 1, f"Benchmark warn {i}")
+
+        result = await measure_sequential(
+            "warnsystem.warn_archived", operation, int(200 * options.scale)
+        )
+    result.extra = counters(bot, api)
+    return result
+
+
+async def get_embeds(options) -> Result:
+    """Build the embeds of a warning for members with about 20 cases each."""
+    rng = random.Random(options.seed)
+    bot, guild, api = await setup(options)
+    seed_cases(api, guild, int(10000 * options.scale), rng)
+    members = _members(guild)
+    reset_counters(bot, api)
+
+    async def operation(i):
+        await api.get_embeds(
+            guild, rng.choice(members), guild.owner, 2, "Spam", timedelta(hours=1)
+        )
+
+    result = await measure_sequential("warnsystem.get_embeds", operation, int(500 * options.scale))
+    result.extra = counters(bot, api)
+    return result
+
+
+async def get_all_cases(options) -> Result:
+    """Get all cases of a guild with 10k cases."""
+    rng = random.Random(options.seed)
+    bot, guild, api = await setup(options)
+    seed_cases(api, guild, int(10000 * options.scale), rng)
+    reset_counters(bot, api)
+
+    async def operation(i):
+        await api.get_all_cases(guild)
+
+    result = await measure_sequential("warnsystem.get_all_cases", operation, 10)
+    result.extra = counters(bot, api)
+    return result
+
+
+async def format_reason(options) -> Result:
+    """Reformat reasons with 50 substitutions set on the guild."""
+    bot, guild, api = await setup(options)
+    substitutions = {f"sub{i}": f"Substitution number {i}, please behave." for i in range(50)}
+    await api.data.guild(guild).substitutions.set(substitutions)
+    reset_counters(bot, api)
+
+    async def operation(i):
+        await api.format_reason(guild, f"Spamming [sub{i % 50}] and [sub{(i + 7) % 50}]")
+
+    result = await measure_sequential(
+        "warnsystem.format_reason", operation, int(5000 * options.scale)
+    )
+    result.extra = counters(bot, api)
+    return result
+
+
+async def check_endwarn(options) -> Result:
+    """One loop pass ending 1k temporary mutes and bans at once."""
+    bot, guild, api = await setup(options, members=int(1000 * options.scale))
+    members = _members(guild)
+    mute_role = guild.get_role(await api.data.guild(guild).mute_role())
+    past = datetime.today() - timedelta(minutes=5)
+    durations = []
+    total = 0.0
+    passes = 3
+    for i in range(passes):
+        temporary_warns = []
+        for j, member in enumerate(members):
+            level = 2 if j % 2 else 5
+            if level == 2:
+                member._fake_roles.append(mute_role)
+            else:
+                guild.bans.add(member.id)
+            temporary_warns.append(
+                {
+                    "level": level,
+                    "author": guild.owner.id,
+                    "reason": "Benchmark temporary warn",
+                    "time": (past - timedelta(hours=1)).strftime(TIME_FORMAT),
+                    "duration": "1 hour",
+                    "until": past.strftime(TIME_FORMAT),
+                    "member": member.id,
+                }
+            )
+        await api.data.guild(guild).temporary_warns.set(temporary_warns)
+        await api.data.guild(guild).reinvite.set(False)
+        reset_counters(bot, api)
+        result = await measure_sequential("", lambda x: api._check_endwarn(), 1)
+        durations.extend(result.durations)
+        total += result.total
+    return Result(
+        "warnsystem.check_endwarn", durations, total, dict(counters(bot, api), ended=len(members))
+    )
+
+
+async def mass_ban(options) -> Result:
+    """500 members banned at the same time."""
+    bot, guild, api = await setup(options, members=int(500 * options.scale))
+    members = _members(guild)
+    reset_counters(bot, api)
+
+    async def operation(i):
+        await api.warn(guild, members[i], guild.owner, 5, "Raid")
+
+    result = await measure_concurrent("warnsystem.mass_ban", operation, len(members))
+    result.extra = counters(bot, api)
+    return result
+
+
+async def warn_storm(options) -> Result:
+    """Warnings of level 1 to 3 coming at --rate per second, on a guild with 10k cases."""
+    rng = random.Random(options.seed)
+    bot, guild, api = await setup(options)
+    seed_cases(api, guild, int(10000 * options.scale), rng)
+    members = _members(guild)
+    reset_counters(bot, api)
+    warns = [(rng.choice(members), rng.randint(1, 3)) for i in range(int(300 * options.scale))]
+
+    async def operation(i):
+        member, level = warns[i]
+        await api.warn(guild, member, guild.owner, level, f"Storm warn {i}", timedelta(hours=1))
+
+    result = await measure_stream("warnsystem.warn_storm", operation, len(warns), options.rate)
+    result.extra = counters(bot, api)
+    return result
+
+
+SCENARIOS = {
+    "warnsystem.warn": warn,
+    "warnsystem.warn_archived": warn_archived,
+    "warnsystem.get_embeds": get_embeds,
+    "warnsystem.get_all_cases": get_all_cases,
+    "warnsystem.format_reason": format_reason,
+    "warnsystem.check_endwarn": check_endwarn,
+    "warnsystem.mass_ban": mass_ban,
+    "warnsystem.warn_storm": warn_storm,
+}
@@ -0,0 +1,85 @@
+"""
+An in-memory Config driver, behaving like Red's JSON driver without touching the disk.
+"""
+
+import asyncio
+import copy
+import json
+
+from contextlib import contextmanager
+from unittest import mock
+
+from redbot.core.config import Config
+from redbot.core.drivers.red_base import BaseDriver
+
+
+class MemoryDriver(BaseDriver):
+    """
+    Store Config data in a :py:class:`dict`.
+
+    Red's JSON driver keeps the data in memory too, but dumps the whole file on each write.
+    With ``serialize`` enabled, that cost is reproduced by encoding the data in an executor.
+
+    Attributes
+    ----------
+    reads: int
+        The number of calls to :meth:`get`.
+    writes: int
+        The number of calls to :meth:`set` and :meth:`clear`.
+    """
+
+    def __init__(self, cog_name: str, identifier: str, serialize: bool = True):
+        super().__init__(cog_name, identifier)
+        self.data = {}
+        self.serialize = serialize
+        self.reads = 0
+        self.writes = 0
+
+    async def _save(self):
+        self.writes += 1
+        if self.serialize:
+            loop = asyncio.get_event_loop()
+            await loop.run_in_executor(None, json.dumps, self.data)
+
+    async def get(self, *identifiers: str):
+        self.reads += 1
+        partial = self.data
+        for i in (self.unique_cog_identifier, *identifiers):
+            partial = partial[i]
+        return copy.deepcopy(partial)
+
+    async def set(self, *identifiers: str, value=None):
+        partial = self.data
+        full_identifiers = (self.unique_cog_identifier, *identifiers)
+        for i in full_identifiers[:-1]:
+            partial = partial.setdefault(i, {})
+        partial[full_identifiers[-1]] = copy.deepcopy(value)
+        await self._save()
+
+    async def clear(self, *identifiers: str):
+        partial = self.data
+        full_identifiers = (self.unique_cog_identifier, *identifiers)
+        try:
+            for i in full_identifiers[:-1]:
+                partial = partial[i]
+            del partial[full_identifiers[-1]]
+        except KeyError:
+            pass
+        else:
+            await self._save()
+
+    def get_config_details(self):
+        return
+
+
+def make_config(cog_name: str, identifier: int = 260, serialize: bool = True) -> Config:
+    """Create a :class:`~redbot.core.config.Config` object using a :class:`MemoryDriver`."""
+    driver = MemoryDriver(cog_name, str(identifier), serialize=serialize)
+    return Config(cog_name, str(identifier), driver, force_registration=True)
+
+
+@contextmanager
+def patch_config(config: Config):
+    """Make ``Config.get_conf`` return the given config, for creating a cog."""
+    with mock.patch.object(Config, "get_conf", return_value=config):
+        yield
@@ -0,0 +1,492 @@
+"""
+In-memory stand-ins for the discord.py objects used by the cogs.
+
+The fake classes inherit from the real discord.py classes so the ``isinstance`` checks made
+by the cogs still pass, but they never call the parent's ``__init__`` and override every
+attribute that would need a connection state. API calls go through :class:`FakeHTTP`, which
+only waits for a simulated latency and counts the requests.
+
+Events are sent to the listeners and the ``wait_for`` calls with :meth:`FakeBot.dispatch`.
+"""
+
+import asyncio
+import itertools
+import random
+
+from collections import Counter
+from datetime import datetime
+
+import discord
+
+_ids = itertools.count(400000000000000000)
+
+
+def new_id() -> int:
+    """Return a new unique snowflake-like ID."""
+    return next(_ids)
+
+
+class FakeHTTP:
+    """
+    Simulated HTTP layer, shared by all fake objects.
+
+    Parameters
+    ----------
+    latency: float
+        The average time in seconds taken by a request. Set to 0 to only measure the cogs.
+    jitter: float
+        The random variation of the latency, as a fraction of it.
+    seed: int
+        The seed used for the random latency, so runs can be compared.
+    rate_limits: float
+        The fraction of the requests answered with a 429. Like discord.py, the request is
+        retried after ``retry_after``, up to 5 times.
+    retry_after: float
+        The time to wait after a 429, in seconds.
+
+    Attributes
+    ----------
+    calls: collections.Counter
+        The number of requests made to each route.
+    rate_limited: int
+        The number of 429 received.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.05,
+        jitter: float = 0.2,
+        seed: int = 0,
+        rate_limits: float = 0.0,
+        retry_after: float = 0.5,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.random = random.Random(seed)
+        self.rate_limits = rate_limits
+        self.retry_after = retry_after
+        self.calls = Counter()
+        self.rate_limited = 0
+
+    @classmethod
+    def from_options(cls, options) -> "FakeHTTP":
+        """Create the HTTP layer from the command line options."""
+        return cls(
+            options.latency, options.jitter, options.seed, options.rate_limits, options.retry_after
+        )
+
+    async def _wait(self):
+        if not self.latency:
+            await asyncio.sleep(0)
+            return
+        delay = self.latency * (1 + self.random.uniform(-self.jitter, self.jitter))
+        await asyncio.sleep(delay)
+
+    async def request(self, route: str):
+        self.calls[route] += 1
+        for i in range(5):
+            await self._wait()
+            if not self.rate_limits or self.random.random() >= self.rate_limits:
+                return
+            self.rate_limited += 1
+            await asyncio.sleep(self.retry_after)
+        raise discord.HTTPException(FakeResponse(429, "Too Many Requests"), "Rate limited.")
+
+
+class FakeInvite:
+    def __init__(self, http: FakeHTTP, guild: "FakeGuild", channel=None, max_uses: int = 0):
+        self._http = http
+        self.guild = guild
+        self.channel = channel
+        self.code = f"{new_id():x}"[-8:]
+        self.url = f"https://discord.gg/{self.code}"
+        self.uses = 0
+        self.max_uses = max_uses
+
+    def __str__(self):
+        return self.url
+
+    async def delete(self, *, reason=None):
+        await self._http.request("delete_invite")
+        self.guild._invites.pop(self.code, None)
+
+
+class FakeUser(discord.User):
+    def __init__(self, http: FakeHTTP, name: str, *, bot: bool = False):
+        self._http = http
+        self.id = new_id()
+        self.name = name
+        self.discriminator = "0000"
+        self.avatar = None
+        self.bot = bot
+        self.dm_messages = 0
+        self._dm_channel = None
+
+    @property
+    def avatar_url(self):
+        return "https://cdn.discordapp.com/embed/avatars/0.png"
+
+    @property
+    def dm_channel(self):
+        if self._dm_channel is None:
+            self._dm_channel = FakeDMChannel(self)
+        return self._dm_channel
+
+    async def send(self, content=None, *, embed=None, **kwargs):
+        await self._http.request("send_dm")
+        self.dm_messages += 1
+        return FakeMessage(self.dm_channel, None, content)
+
+
+class FakeRole(discord.Role):
+    def __init__(self, guild: "FakeGuild", name: str, position: int, permissions=None):
+        self.id = new_id()
+        self.guild = guild
+        self.name = name
+        self.position = position
+        self.permissions = permissions or discord.Permissions.none()
+        self.managed = False
+        self.hoist = False
+        self.mentionable = False
+        self.colour = discord.Colour.default()
+
+    async def edit(self, *, reason=None, **fields):
+        await self.guild._http.request("edit_role")
+        for key, value in fields.items():
+            setattr(self, key, value)
+
+
+class FakeMember(discord.Member):
+    def __init__(self, guild: "FakeGuild", user: FakeUser, roles: list = None):
+        self._user = user
+        self.guild = guild
+        self.nick = None
+        self.joined_at = datetime.utcnow()
+        self._fake_roles = [guild.default_role] + list(roles or [])
+
+    @property
+    def _http(self):
+        return self.guild._http
+
+    @property
+    def roles(self):
+        return sorted(self._fake_roles, key=lambda x: x.position)
+
+    @property
+    def top_role(self):
+        return max(self._fake_roles, key=lambda x: x.position)
+
+    @property
+    def guild_permissions(self):
+        if self.guild.owner_id == self.id:
+            return discord.Permissions.all()
+        value = 0
+        for role in self._fake_roles:
+            value |= role.permissions.value
+        permissions = discord.Permissions(value)
+        if permissions.administrator:
+            return discord.Permissions.all()
+        return permissions
+
+    async def send(self, content=None, *, embed=None, **kwargs):
+        await self._user.send(content, embed=embed, **kwargs)
+
+    async def add_roles(self, *roles, reason=None, atomic=True):
+        for role in roles:
+            await self._http.request("add_role")
+            if role not in self._fake_roles:
+                self._fake_roles.append(role)
+
+    async def remove_roles(self, *roles, reason=None, atomic=True):
+        for role in roles:
+            await self._http.request("remove_role")
+            if role in self._fake_roles:
+                self._fake_roles.remove(role)
+
+
+class FakeTextChannel(discord.TextChannel):
+    def __init__(self, guild: "FakeGuild", name: str, position: int):
+        self.id = new_id()
+        self.guild = guild
+        self.name = name
+        self.position = position
+        self.topic = None
+        self.nsfw = False
+        self.category_id = None
+        self.messages = 0
+
+    @property
+    def members(self):
+        return self.guild.members
+
+    def permissions_for(self, member):
+        return member.guild_permissions
+
+    async def send(self, content=None, *, embed=None, files=None, **kwargs):
+        await self.guild._http.request("send_message")
+        self.messages += 1
+        return FakeMessage(self, self.guild.me, content)
+
+    async def create_invite(self, *, reason=None, max_uses=0, **fields):
+        await self.guild._http.request("create_invite")
+        invite = FakeInvite(self.guild._http, self.guild, self, max_uses=max_uses)
+        self.guild._invites[invite.code] = invite
+        return invite
+
+    async def set_permissions(self, target, *, overwrite=None, reason=None, **permissions):
+        await self.guild._http.request("edit_channel_permissions")
+
+
+class FakeDMChannel(discord.DMChannel):
+    def __init__(self, user: FakeUser):
+        self.id = new_id()
+        self.recipient = user
+        self.me = None
+
+    async def send(self, content=None, *, embed=None, files=None, **kwargs):
+        return await self.recipient.send(content, embed=embed, files=files, **kwargs)
+
+
+class FakeMessage(discord.Message):
+    def __init__(self, channel, author, content: str = ""):
+        self.id = new_id()
+        self.channel = channel
+        self.author = author
+        self.content = content or ""
+        self.attachments = []
+        self.embeds = []
+        self.mentions = []
+        self.role_mentions = []
+        self.reactions = []
+        self.pinned = False
+        self.tts = False
+        self.type = discord.MessageType.default
+
+    async def add_reaction(self, emoji):
+        await self._http.request("add_reaction")
+
+    async def delete(self):
+        await self._http.request("delete_message")
+
+    @property
+    def _http(self):
+        if isinstance(self.channel, FakeDMChannel):
+            return self.channel.recipient._http
+        return self.channel.guild._http
+
+
+class FakeGuild(discord.Guild):
+    def __init__(self, http: FakeHTTP, name: str):
+        self._http = http
+        self.id = new_id()
+        self.name = name
+        self.unavailable = False
+        self._fake_members = {}
+        self._fake_roles = {}
+        self._fake_channels = {}
+        self._invites = {}
+        self.bans = set()
+        self._me = None
+        default = FakeRole(self, "@everyone", 0)
+        default.id = self.id  # like Discord, the default role has the guild's ID
+        self._fake_roles[default.id] = default
+        self.owner_id = None
+
+    @property
+    def default_role(self):
+        return self._fake_roles[self.id]
+
+    @property
+    def me(self):
+        return self._me
+
+    @property
+    def owner(self):
+        return self._fake_members.get(self.owner_id)
+
+    @property
+    def members(self):
+        return list(self._fake_members.values())
+
+    @property
+    def member_count(self):
+        return len(self._fake_members)
+
+    @property
+    def roles(self):
+        return sorted(self._fake_roles.values(), key=lambda x: x.position)
+
+    @property
+    def channels(self):
+        return list(self._fake_channels.values())
+
+    @property
+    def text_channels(self):
+        return sorted(self._fake_channels.values(), key=lambda x: x.position)
+
+    def get_member(self, user_id):
+        return self._fake_members.get(user_id)
+
+    def get_role(self, role_id):
+        return self._fake_roles.get(role_id)
+
+    def get_channel(self, channel_id):
+        return self._fake_channels.get(channel_id)
+
+    def add_role(self, name: str, position: int, permissions=None) -> FakeRole:
+        role = FakeRole(self, name, position, permissions)
+        self._fake_roles[role.id] = role
+        return role
+
+    def add_member(self, user: FakeUser, roles: list = None) -> FakeMember:
+        member = FakeMember(self, user, roles)
+        self._fake_members[user.id] = member
+        return member
+
+    def add_text_channel(self, name: str) -> FakeTextChannel:
+        channel = FakeTextChannel(self, name, len(self._fake_channels))
+        self._fake_channels[channel.id] = channel
+        return channel
+
+    async def create_role(self, *, reason=None, name="new role", **fields):
+        await self._http.request("create_role")
+        return self.add_role(name, 1)
+
+    async def kick(self, user, *, reason=None):
+        await self._http.request("kick_member")
+        self._fake_members.pop(user.id, None)
+
+    async def ban(self, user, *, reason=None, delete_message_days=1):
+        await self._http.request("ban_member")
+        self._fake_members.pop(user.id, None)
+        self.bans.add(user.id)
+
+    async def unban(self, user, *, reason=None):
+        await self._http.request("unban_member")
+        self.bans.discard(user.id)
+
+    async def invites(self):
+        await self._http.request("get_invites")
+        return list(self._invites.values())
+
+
+class FakeBot:
+    """
+    A stand-in for :class:`redbot.core.bot.Red`, with only what the cogs use.
+
+    The guilds and users must be registered with :meth:`add_guild` and :meth:`add_user`.
+    """
+
+    def __init__(self, http: FakeHTTP, loop: asyncio.AbstractEventLoop = None):
+        self.http = http
+        self.loop = loop or asyncio.get_event_loop()
+        self.users = {}
+        self.guilds = {}
+        self.color = 0xFF0000
+        self.user = self.add_user("Red", bot=True)
+        self.owner = self.add_user("Owner")
+        self.owner_id = self.owner.id
+        self.listeners = []
+        self.waiters = []
+
+    def add_user(self, name: str, *, bot: bool = False) -> FakeUser:
+        user = FakeUser(self.http, name, bot=bot)
+        self.users[user.id] = user
+        return user
+
+    def add_guild(self, name: str) -> FakeGuild:
+        guild = FakeGuild(self.http, name)
+        self.guilds[guild.id] = guild
+        return guild
+
+    def get_user(self, user_id):
+        return self.users.get(user_id)
+
+    def get_guild(self, guild_id):
+        return self.guilds.get(guild_id)
+
+    def get_channel(self, channel_id):
+        for guild in self.guilds.values():
+            channel = guild.get_channel(channel_id)
+            if channel:
+                return channel
+        return None
+
+    async def get_user_info(self, user_id):
+        await self.http.request("get_user")
+        user = self.users.get(user_id)
+        if user is None:
+            raise discord.errors.NotFound(FakeResponse(404), "Unknown User")
+        return user
+
+    async def is_owner(self, user):
+        return user.id == self.owner_id
+
+    async def wait_until_ready(self):
+        pass
+
+    def add_listener(self, func, name=None):
+        self.listeners.append((name or func.__name__, func))
+
+    def remove_listener(self, func, name=None):
+        name = name or func.__name__
+        self.listeners = [x for x in self.listeners if not (x[0] == name and x[1] == func)]
+
+    async def wait_for(self, event: str, *, check=None, timeout=None):
+        future = self.loop.create_future()
+        self.waiters.append((event, check, future))
+        return await asyncio.wait_for(future, timeout)
+
+    def dispatch(self, event: str, *args) -> list:
+        """
+        Resolve the ``wait_for`` calls and schedule the listeners of an event, like
+        discord.py does. The tasks of the listeners are returned.
+        """
+        for waiter in list(self.waiters):
+            name, check, future = waiter
+            if name != event:
+                continue
+            if future.done():
+                self.waiters.remove(waiter)
+                continue
+            try:
+                if check is not None and not check(*args):
+                    continue
+            except Exception as e:
+                future.set_exception(e)
+            else:
+                future.set_result(args[0] if len(args) == 1 else args)
+            self.waiters.remove(waiter)
+        name = "on_" + event
+        return [self.loop.create_task(func(*args)) for x, func in self.listeners if x == name]
+
+
+class FakeResponse:
+    """The minimal ``aiohttp`` response needed to build a :class:`discord.HTTPException`."""
+
+    def __init__(self, status: int, reason: str = ""):
+        self.status = status
+        self.reason = reason
+
+
+def make_guild(
+    bot: FakeBot, members: int = 500, channels: int = 5, name: str = "Benchmark"
+) -> FakeGuild:
+    """
+    Build a guild with a bot member above everyone, a mute role, a moderator and some members.
+
+    The first text channel is meant to be used as the modlog channel.
+    """
+    guild = bot.add_guild(name)
+    guild.add_role("Muted", 1)
+    member_role = guild.add_role("Member", 2)
+    mod_role = guild.add_role("Moderator", 3, discord.Permissions(8))  # administrator
+    bot_role = guild.add_role("Bot", 10, discord.Permissions(8))
+    guild._me = guild.add_member(bot.user, [bot_role])
+    owner = guild.add_member(bot.owner, [mod_role])
+    guild.owner_id = owner.id
+    for i in range(channels):
+        guild.add_text_channel(f"channel-{i}")
+    for i in range(members):
+        guild.add_member(bot.add_user(f"member-{i}"), [member_role])
+    return guild
@@ -0,0 +1,158 @@
+"""
+Timing helpers and report formatting.
+"""
+
+import asyncio
+import time
+
+from typing import Awaitable, Callable, Iterable, List
+
+from laggron_utils.utils import percentile
+
+
+class Result:
+    """
+    The measures of a scenario.
+
+    Attributes
+    ----------
+    name: str
+        The name of the scenario.
+    durations: List[float]
+        The duration of each operation, in seconds.
+    total: float
+        The wall-clock time taken by the whole scenario, in seconds.
+    extra: dict
+        Additional counters reported by the scenario (HTTP calls, config writes...)
+    """
+
+    def __init__(self, name: str, durations: List[float], total: float, extra: dict = None):
+        self.name = name
+        self.durations = durations
+        self.total = total
+        self.extra = extra or {}
+
+    @property
+    def count(self) -> int:
+        return len(self.durations)
+
+    @property
+    def throughput(self) -> float:
+        return self.count / self.total if self.total else 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "count": self.count,
+            "total": self.total,
+            "throughput": self.throughput,
+            "p50": percentile(self.durations, 50),
+            "p99": percentile(self.durations, 99),
+            "max": max(self.durations) if self.durations else 0.0,
+            "extra": self.extra,
+        }
+
+
+async def measure_sequential(
+    name: str, operation: Callable[[int], Awaitable], count: int, extra: dict = None
+) -> Result:
+    """Call ``operation(i)`` ``count`` times, one after the other."""
+    durations = []
+    start = time.perf_counter()
+    for i in range(count):
+        op_start = time.perf_counter()
+        await operation(i)
+        durations.append(time.perf_counter() - op_start)
+    return Result(name, durations, time.perf_counter() - start, extra)
+
+
+async def measure_concurrent(
+    name: str, operation: Callable[[int], Awaitable], count: int, extra: dict = None
+) -> Result:
+    """Call ``operation(i)`` ``count`` times, all at once."""
+    durations = [0.0] * count
+
+    async def timed(i):
+        op_start = time.perf_counter()
+        await operation(i)
+        durations[i] = time.perf_counter() - op_start
+
+    start = time.perf_counter()
+    await asyncio.gather(*[timed(i) for i in range(count)])
+    return Result(name, durations, time.perf_counter() - start, extra)
+
+
+async def measure_stream(
+    name: str, operation: Callable[[int], Awaitable], count: int, rate: float, extra: dict = None
+) -> Result:
+    """
+    Start ``operation(i)`` ``count`` times at a fixed rate, without waiting for the previous
+    ones to end, like events coming from Discord.
+
+    The duration of an operation includes the time it waited behind the others. A rate of 0
+    starts everything at once.
+    """
+    durations = [0.0] * count
+
+    async def timed(i):
+        op_start = time.perf_counter()
+        await operation(i)
+        durations[i] = time.perf_counter() - op_start
+
+    start = time.perf_counter()
+    tasks = []
+    for i in range(count):
+        if rate:
+            # sleeping from the start prevents the delays from adding up
+            delay = start + i / rate - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        tasks.append(asyncio.ensure_future(timed(i)))
+    await asyncio.gather(*tasks)
+    return Result(name, durations, time.perf_counter() - start, extra)
+
+
+def format_report(results: Iterable[Result]) -> str:
+    """Make a text table of the results."""
+    lines = [
+        f"{'scenario':<32} {'ops':>7} {'total (s)':>10} {'ops/s':>10} "
+        f"{'p50 (ms)':>10} {'p99 (ms)':>10}"
+    ]
+    for result in results:
+        data = result.to_dict()
+        lines.append(
+            f"{data['name']:<32} {data['count']:>7} {data['total']:>10.3f} "
+            f"{data['throughput']:>10.1f} {data['p50'] * 1000:>10.2f} {data['p99'] * 1000:>10.2f}"
+        )
+        if data["extra"]:
+            extra = ", ".join(f"{x}={y}" for x, y in sorted(data["extra"].items()))
+            lines.append(f"    {extra}")
+    return "\n".join(lines)
+
+
+def _change(old: float, new: float) -> str:
+    if not old:
+        return "n/a"
+    return f"{(new - old) / old * 100:+.1f}%"
+
+
+def compare_reports(old: dict, new: dict) -> str:
+    """
+    Make a text table comparing two reports written with ``--json``.
+
+    Only the scenarios present in both reports are compared.
+    """
+    old_results = {x["name"]: x for x in old["results"]}
+    lines = [f"{'scenario':<32} {'p50 (ms)':>25} {'p99 (ms)':>25} {'ops/s':>25}"]
+    for data in new["results"]:
+        previous = old_results.get(data["name"])
+        if previous is None:
+            continue
+        columns = []
+        for key, factor in (("p50", 1000), ("p99", 1000), ("throughput", 1)):
+            columns.append(
+                f"{previous[key] * factor:>7.1f} > {data[key] * factor:<7.1f}"
+                f"{_change(previous[key], data[key]):>8}"
+            )
+        lines.append(f"{data['name']:<32} " + " ".join(columns))
+    return "\n".join(lines)
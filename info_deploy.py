@@ -11,6 +11,7 @@ from warnsystem import WarnSystem
 from instantcmd import InstantCommands
 from roleinvite import RoleInvite
 from say import Say
+import laggron_utils
 
 
 class Default:
@@ -106,5 +107,6 @@ if __name__ == "__main__":
     create_info_json(InstantCommands, "instantcmd")
     create_info_json(RoleInvite, "roleinvite")
     create_info_json(Say, "say")
+    create_info_json(laggron_utils, "laggron_utils")
     create_info_json(Default, ".")  # repo info.json
     commit(token=sys.argv[1], build=sys.argv[2], to_add=to_add)
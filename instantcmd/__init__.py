@@ -3,6 +3,8 @@ import asyncio
 
 from redbot.core.data_manager import cog_data_path
 
+from laggron_utils.cache import wait_closed
+
 from .instantcmd import InstantCommands
 from .loggers import Log
 
@@ -86,6 +88,8 @@ async def ask_reset(bot, commands):
 
 async def setup(bot):
     n = InstantCommands(bot)
+    # the previous instance may still be saving its config after a reload
+    await wait_closed(n.data.driver.cog_name)
     sentry = Log(bot, n.__version__)
     sentry.enable_stdout()
     n._set_log(sentry)
@@ -14,6 +14,8 @@ from redbot.core import Config
 from redbot.core.utils.predicates import MessagePredicate
 from redbot.core.utils.chat_formatting import pagify
 
+from laggron_utils.cache import CachedDriver
+
 if TYPE_CHECKING:
     from .loggers import Log
 
@@ -55,6 +57,7 @@ class InstantCommands(BaseCog):
 
         def_global = {"commands": {}, "enable_sentry": None, "updated_body": False}
         self.data.register_global(**def_global)
+        self.data.driver = CachedDriver(self.data.driver)
         self.listeners = {}
 
         # these are the availables values when creating an instant cmd
@@ -360,9 +363,6 @@ class InstantCommands(BaseCog):
         await ctx.send(message)
 
     # error handling
-    def _set_context(self, data):
-        self.sentry.client.extra_context(data)
-
     async def on_command_error(self, ctx, error):
         if not isinstance(error, commands.CommandInvokeError):
             return
@@ -388,12 +388,13 @@ class InstantCommands(BaseCog):
         }
         if ctx.guild:
             context["guild"] = f"{ctx.guild.name} (ID: {ctx.guild.id})"
-        self.sentry.disable_stdout()  # remove console output since red also handle this
+        # the context is attached to this record only, and the console output is skipped
+        # since Red already handles this
         log.error(
-            f"Exception in command '{ctx.command.qualified_name}'.\n\n", exc_info=error.original
+            f"Exception in command '{ctx.command.qualified_name}'.\n\n",
+            exc_info=error.original,
+            extra={"data": context, "no_stdout": True},
         )
-        self.sentry.enable_stdout()  # re-enable console output for warnings
-        self._set_context({})  # remove context for future logs
 
     # correctly unload the cog
     def __unload(self):
@@ -405,7 +406,10 @@ class InstantCommands(BaseCog):
 
             # remove all handlers from the logger, this prevents adding
             # multiple times the same handler if the cog gets reloaded
+            self.sentry.disable()
             log.handlers = []
+            self.sentry.stop_file_logging()
+            self.data.driver.schedule_close()
 
         # I am forced to put everything in an async function to execute the remove_commands
         # function, and then remove the handlers. Using loop.create_task on remove_commands only
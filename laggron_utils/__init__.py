@@ -0,0 +1,20 @@
+"""
+Utilities shared by Laggron's cogs.
+
+This is installed by Red with any cog of the repository.
+"""
+
+from .loggers import Log
+
+__author__ = "retke (El Laggron)"
+__info__ = {
+    "bot_version": "3.0.0rc1",
+    "description": "Utilities shared by Laggron's cogs, such as logging and error reporting.",
+    "hidden": True,
+    "install_msg": "",
+    "required_cogs": [],
+    "requirements": [],
+    "short": "Utilities shared by Laggron's cogs.",
+    "tags": [],
+    "type": "SHARED_LIBRARY",
+}
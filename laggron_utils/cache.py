@@ -0,0 +1,249 @@
+import asyncio
+import copy
+import logging
+
+from collections import OrderedDict
+
+log = logging.getLogger("laggron.utils")
+
+MISSING = object()  # cached absence of a value, the driver raises KeyError
+CLEAR = object()  # pending clear
+
+_closing = {}  # cog name: task sending the pending writes of an unloaded cog
+
+
+def _overlaps(first: tuple, second: tuple) -> bool:
+    """Tell if one of the identifiers is a parent of the other, or equal."""
+    size = min(len(first), len(second))
+    return first[:size] == second[:size]
+
+
+async def wait_closed(cog_name: str):
+    """
+    Wait until the pending writes of the previous instance of a cog are sent, call this in
+    ``setup`` before reading the config.
+    """
+    task = _closing.pop(cog_name, None)
+    if task is not None:
+        await task
+
+
+def _copy(value):
+    if isinstance(value, (dict, list)):
+        return copy.deepcopy(value)
+    return value
+
+
+class CachedDriver:
+    """
+    Wrap a Config driver with an in-memory read-through cache.
+
+    .. code-block:: python3
+
+        self.data = Config.get_conf(self, 260)
+        self.data.driver = CachedDriver(self.data.driver)
+
+    Every read is cached with its identifiers (or served from a cached parent), and every
+    write updates the cache before reaching the driver. This is only correct if the driver
+    is not modified from somewhere else, which is the case for a cog's Config.
+
+    With ``write_behind``, writes are only applied to the cache then sent to the driver in
+    batches, at most ``write_behind`` seconds later. Successive writes at the same place are
+    merged. Pending writes are sent before a read that isn't cached and overlaps them, and
+    :meth:`close` must be awaited when unloading the cog. From a sync ``__unload``, call
+    :meth:`schedule_close` instead, and :func:`wait_closed` in ``setup``.
+
+    Parameters
+    ----------
+    driver
+        The driver to wrap, ``config.driver``.
+    max_entries: int
+        The number of reads kept in memory, the least recently used are forgotten.
+    write_behind: Optional[float]
+        The maximum delay before sending writes to the driver, in seconds. Writes are sent
+        immediately if not set.
+
+    Attributes
+    ----------
+    hits: int
+        The number of reads served from the cache.
+    misses: int
+        The number of reads sent to the driver.
+    """
+
+    def __init__(self, driver, max_entries: int = 10000, write_behind: float = None):
+        self.driver = driver
+        self.max_entries = max_entries
+        self.write_behind = write_behind
+        self.cache = OrderedDict()  # identifiers: value or MISSING
+        self.pending = []  # (identifiers, value or CLEAR), in the order they were made
+        self.flush_task = None
+        self.lock = asyncio.Lock()
+        self.reads = []  # [identifiers, stale] of the reads sent to the driver
+        self.hits = 0
+        self.misses = 0
+
+    def __getattr__(self, name):
+        return getattr(self.driver, name)
+
+    def _lookup(self, identifiers: tuple):
+        """Get a value from the cache. Raises LookupError if it is not cached."""
+        for i in range(len(identifiers), -1, -1):
+            value = self.cache.get(identifiers[:i])
+            if value is None and identifiers[:i] not in self.cache:
+                continue
+            self.cache.move_to_end(identifiers[:i])
+            for key in identifiers[i:]:
+                if not isinstance(value, dict) or key not in value:
+                    return MISSING
+                value = value[key]
+            return value
+        raise LookupError(identifiers)
+
+    def _store(self, identifiers: tuple, value):
+        self.cache[identifiers] = value
+        self.cache.move_to_end(identifiers)
+        if len(self.cache) > self.max_entries:
+            self.cache.popitem(last=False)
+
+    def _update(self, identifiers: tuple, value):
+        """Apply a write to the cache."""
+        for read in self.reads:
+            if _overlaps(read[0], identifiers):
+                read[1] = True  # the value read may be older than this write
+        for key in [x for x in self.cache if x[: len(identifiers)] == identifiers]:
+            del self.cache[key]  # the whole value is replaced
+        cached_parent = False
+        for i in range(len(identifiers) - 1, -1, -1):
+            parent = identifiers[:i]
+            if parent not in self.cache:
+                continue
+            cached_parent = True
+            partial = self.cache[parent]
+            try:
+                for key in identifiers[i:-1]:
+                    if value is CLEAR and key not in partial:
+                        break
+                    partial = partial.setdefault(key, {})
+                else:
+                    if value is CLEAR:
+                        partial.pop(identifiers[-1], None)
+                    else:
+                        partial[identifiers[-1]] = _copy(value)
+            except (AttributeError, TypeError):
+                # not a dict, this is now invalid for the driver too
+                del self.cache[parent]
+        if not cached_parent:
+            self._store(identifiers, MISSING if value is CLEAR else _copy(value))
+
+    def _overlaps_pending(self, identifiers: tuple) -> bool:
+        return any(_overlaps(x, identifiers) for x, y in self.pending)
+
+    async def get(self, *identifiers: str):
+        try:
+            value = self._lookup(identifiers)
+        except LookupError:
+            pass
+        else:
+            self.hits += 1
+            if value is MISSING:
+                raise KeyError(identifiers[-1] if identifiers else None)
+            return _copy(value)
+        self.misses += 1
+        if self.lock.locked() or self._overlaps_pending(identifiers):
+            # the writes must reach the driver before reading, including the one being sent
+            await self.flush()
+        read = [identifiers, False]
+        self.reads.append(read)
+        try:
+            value = await self.driver.get(*identifiers)
+        except KeyError:
+            if not read[1]:
+                self._store(identifiers, MISSING)
+            raise
+        finally:
+            self.reads.remove(read)
+        if not read[1]:
+            self._store(identifiers, _copy(value))
+        return value
+
+    def _forget(self, identifiers: tuple):
+        """Drop the cached values around a write that failed, the driver may not have them."""
+        for read in self.reads:
+            if _overlaps(read[0], identifiers):
+                read[1] = True
+        for key in [x for x in self.cache if _overlaps(x, identifiers)]:
+            del self.cache[key]
+
+    async def set(self, *identifiers: str, value=None):
+        self._update(identifiers, value)
+        if self.write_behind is None:
+            try:
+                return await self.driver.set(*identifiers, value=value)
+            except BaseException:
+                self._forget(identifiers)
+                raise
+        self._add_pending(identifiers, _copy(value))
+
+    async def clear(self, *identifiers: str):
+        self._update(identifiers, CLEAR)
+        if self.write_behind is None:
+            try:
+                return await self.driver.clear(*identifiers)
+            except BaseException:
+                self._forget(identifiers)
+                raise
+        self._add_pending(identifiers, CLEAR)
+
+    def _add_pending(self, identifiers: tuple, value):
+        # a set replaces the writes at or under its place, and creates the parents like them,
+        # but a clear only replaces the clears, the sets may have created its parents
+        self.pending = [
+            (x, y)
+            for x, y in self.pending
+            if x[: len(identifiers)] != identifiers or (value is CLEAR and y is not CLEAR)
+        ]
+        self.pending.append((identifiers, value))
+        if self.flush_task is None:
+            self.flush_task = asyncio.ensure_future(self._delayed_flush())
+
+    async def _delayed_flush(self):
+        await asyncio.sleep(self.write_behind)
+        self.flush_task = None
+        await self.flush()
+
+    async def flush(self):
+        """Send the pending writes to the driver."""
+        async with self.lock:
+            while self.pending:
+                identifiers, value = self.pending.pop(0)
+                try:
+                    if value is CLEAR:
+                        await self.driver.clear(*identifiers)
+                    else:
+                        await self.driver.set(*identifiers, value=value)
+                except Exception as e:
+                    log.error(
+                        f"Couldn't write the config of {self.driver.cog_name} at {identifiers}.",
+                        exc_info=e,
+                    )
+                    # the cache now differs from the driver
+                    self.invalidate()
+
+    def invalidate(self):
+        """Forget all the cached values."""
+        self.cache.clear()
+
+    async def close(self):
+        """Cancel the delayed write and send the pending writes, call this on unload."""
+        if self.flush_task is not None:
+            self.flush_task.cancel()
+            self.flush_task = None
+        await self.flush()
+
+    def schedule_close(self):
+        """
+        Run :meth:`close` in a task, kept until :func:`wait_closed` is awaited by the next
+        instance of the cog.
+        """
+        _closing[self.driver.cog_name] = asyncio.ensure_future(self.close())
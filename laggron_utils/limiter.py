@@ -0,0 +1,145 @@
+import logging
+import time
+import traceback
+
+from collections import OrderedDict
+
+
+def fingerprint(record: logging.LogRecord) -> tuple:
+    """
+    Identify the origin of an error, two records with the same fingerprint are the same error.
+
+    With an exception, this is its type and the line where it was raised. Otherwise, this is
+    the line of the logging call and the message, without the formatted arguments.
+    """
+    if record.exc_info and record.exc_info[0] is not None:
+        exc_type, _, tb = record.exc_info
+        frames = traceback.extract_tb(tb)
+        where = (frames[-1].filename, frames[-1].lineno) if frames else None
+        return (record.name, exc_type.__qualname__, where)
+    return (record.name, record.pathname, record.lineno, str(record.msg))
+
+
+def describe(record: logging.LogRecord) -> str:
+    """Short description of an error for the summaries."""
+    message = record.getMessage().strip().splitlines()[0]
+    if record.exc_info and record.exc_info[0] is not None:
+        exc_type, exc, _ = record.exc_info
+        message += f" ({exc_type.__name__}: {exc})"
+    return message[:200]
+
+
+class ReportLimiter(logging.Filter):
+    """
+    Filter for the Sentry handler preventing error storms from sending thousands of events.
+
+    *   An error is only sent once per ``window``, the next occurrences are counted.
+    *   New errors are limited by a token bucket: ``burst`` events at once, then one event
+        every ``1 / rate`` seconds.
+    *   The occurrences that were not sent are reported with :meth:`summaries`, which is
+        called periodically by the cog's :class:`~laggron_utils.loggers.Log`.
+
+    Parameters
+    ----------
+    rate: float
+        The number of events that can be sent per second, on average.
+    burst: int
+        The number of events that can be sent at once.
+    window: int
+        The time during which an error isn't sent again, in seconds.
+    max_errors: int
+        The number of different errors remembered. Past that, the new errors are only counted.
+
+    Attributes
+    ----------
+    sent: int
+        The number of events let through.
+    suppressed: int
+        The number of events blocked.
+    """
+
+    def __init__(
+        self, rate: float = 10 / 60, burst: int = 10, window: int = 3600, max_errors: int = 200
+    ):
+        super().__init__()
+        self.rate = rate
+        self.burst = burst
+        self.window = window
+        self.max_errors = max_errors
+        self.tokens = burst
+        self.last_refill = time.monotonic()
+        # fingerprint: [expiration, occurrences not sent, description]
+        self.errors = OrderedDict()
+        self.overflow = 0  # occurrences of errors not remembered
+        self.sent = 0
+        self.suppressed = 0
+
+    def _take_token(self, now: float) -> bool:
+        self.tokens = min(self.burst, self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if getattr(record, "report_summary", False):
+            return True
+        now = time.monotonic()
+        key = fingerprint(record)
+        error = self.errors.get(key)
+        if error is not None and error[0] > now:
+            error[1] += 1
+            self.suppressed += 1
+            return False
+        if error is None and len(self.errors) >= self.max_errors:
+            self.overflow += 1
+            self.suppressed += 1
+            return False
+        if not self._take_token(now):
+            if error is None:
+                self.errors[key] = [now, 1, describe(record)]
+            else:
+                error[1] += 1
+            self.suppressed += 1
+            return False
+        if error is not None and error[1]:
+            # the occurrences waiting for a summary are not lost
+            self.errors[key] = [now + self.window, error[1], error[2]]
+        else:
+            self.errors[key] = [now + self.window, 0, describe(record)]
+        self.errors.move_to_end(key)
+        self.sent += 1
+        return True
+
+    def summaries(self, logger_name: str) -> list:
+        """
+        Build the records reporting the occurrences that were not sent since the last call,
+        and forget the expired errors.
+        """
+        now = time.monotonic()
+        records = []
+        for key, error in list(self.errors.items()):
+            expiration, count, description = error
+            if count:
+                records.append(
+                    self._make_record(
+                        logger_name, "%s more occurrences of this error: %s", count, description
+                    )
+                )
+                error[1] = 0
+            if expiration <= now:
+                del self.errors[key]
+        if self.overflow:
+            records.append(
+                self._make_record(
+                    logger_name, "%s occurrences of other errors were not reported.", self.overflow
+                )
+            )
+            self.overflow = 0
+        return records
+
+    def _make_record(self, logger_name: str, msg: str, *args) -> logging.LogRecord:
+        record = logging.LogRecord(logger_name, logging.ERROR, __file__, 0, msg, args, None)
+        record.report_summary = True
+        return record
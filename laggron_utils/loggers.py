@@ -0,0 +1,229 @@
+import logging
+import asyncio
+import copy
+import platform
+import gzip
+import os
+import shutil
+
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from queue import Queue
+from typing import TYPE_CHECKING
+from redbot.core.data_manager import cog_data_path
+from redbot.core import __version__ as red_version
+
+from .limiter import ReportLimiter
+
+if TYPE_CHECKING:
+    from redbot.core.bot import RedBase
+    from distutils.version import StrictVersion
+    from raven.handlers.logging import SentryHandler
+
+
+def stdout_filter(record: logging.LogRecord) -> bool:
+    """
+    Skip the records logged with ``extra={"no_stdout": True}``.
+
+    Use this instead of removing the stdout handler, which is shared by all tasks.
+    """
+    return not getattr(record, "no_stdout", False)
+
+
+def compress_rotated_file(source: str, dest: str):
+    """Rotator for the log files, the old file is compressed with gzip."""
+    with open(source, "rb") as file, gzip.open(dest, "wb") as compressed_file:
+        shutil.copyfileobj(file, compressed_file)
+    os.remove(source)
+
+
+class CopyingQueueHandler(QueueHandler):
+    """
+    A :py:class:`~logging.handlers.QueueHandler` that queues a copy of the records.
+
+    The original one formats the message of the record and removes its traceback, the
+    handlers called after it (stdout, Sentry) would not get them.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return super().prepare(copy.copy(record))
+
+
+class Log:
+    """
+    Logging and error reporting management for a cog.
+
+    Each cog subclasses this and sets the class attributes below.
+
+    The Sentry client is only imported and created when error reporting is enabled, most
+    instances never enable it.
+
+    Credit to Cog-Creators for the code base.
+
+    Attributes
+    ----------
+    cog_name: str
+        The name of the cog, also used for its data folder.
+    logger_name: str
+        The name of the cog's logger.
+    file_name: str
+        The name of the log file, in the cog's data folder.
+    dsn: str
+        The Sentry DSN of the cog.
+    summary_interval: int
+        The time between two summaries of the errors not sent to Sentry, in seconds.
+    """
+
+    cog_name = None
+    logger_name = None
+    file_name = None
+    dsn = None
+    summary_interval = 600
+
+    def __init__(
+        self,
+        bot: "RedBase",
+        version: "StrictVersion",
+        max_bytes: int = 5 * 1024 * 1024,
+        backup_count: int = 5,
+        compress: bool = True,
+    ):
+        self.bot = bot
+        self.version = version
+        self.log = logging.getLogger(self.logger_name)
+        self.log.setLevel(logging.DEBUG)
+        # log files rotation, an old file is deleted after backup_count rotations
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.compress = compress
+        self.queue_listener = None
+        self.queue_handler = None
+        self.client = None
+        self.sentry_handler = None
+        self.limiter = ReportLimiter()  # deduplication and rate limit of the errors
+        self.summary_task = None
+        self.format = logging.Formatter(
+            f"%(asctime)s %(levelname)s {self.cog_name}: %(message)s",
+            datefmt="[%d/%m/%Y %H:%M]",
+        )
+        self.stdout_handler = self.init_logger()
+
+    def init_sentry(self) -> "SentryHandler":
+        from raven import Client
+        from raven.handlers.logging import SentryHandler
+        from .reporting import shared_transport
+
+        # all clients send their events through the same service
+        self.client = Client(dsn=self.dsn, release=self.version, transport=shared_transport)
+        owner = self.bot.get_user(self.bot.owner_id)
+        self.client.environment = f"{platform.system()} ({platform.release()})"
+        self.client.user_context(
+            {
+                "id": self.bot.user.id,
+                "name": str(self.bot.user),
+                "Owner": f"{str(owner)} (ID: {owner.id})" if owner else "Not defined",
+            }
+        )
+        self.client.tags_context({"red_version": red_version})
+        sentry_handler = SentryHandler(self.client)
+        sentry_handler.setLevel(logging.ERROR)  # only send errors
+        sentry_handler.addFilter(self.limiter)
+        return sentry_handler
+
+    def init_logger(self) -> logging.StreamHandler:
+        # logging to a log file
+        # file is automatically created by the module, if the parent foler exists
+        cog_path = cog_data_path(raw_name=self.cog_name)
+        if cog_path.exists():
+            log_path = cog_path / self.file_name
+            file_logger = RotatingFileHandler(
+                str(log_path), maxBytes=self.max_bytes, backupCount=self.backup_count
+            )
+            if self.compress:
+                file_logger.namer = lambda name: name + ".gz"
+                file_logger.rotator = compress_rotated_file
+            file_logger.setLevel(logging.DEBUG)
+            file_logger.setFormatter(self.format)
+            # the file is written by another thread, logging never blocks the event loop
+            queue = Queue()
+            self.queue_listener = QueueListener(queue, file_logger, respect_handler_level=True)
+            self.queue_listener.start()
+            self.queue_handler = CopyingQueueHandler(queue)
+            self.queue_handler.setLevel(logging.DEBUG)
+            self.log.addHandler(self.queue_handler)
+
+        # stdout stuff
+        stdout_handler = logging.StreamHandler()
+        stdout_handler.setFormatter(self.format)
+        stdout_handler.addFilter(stdout_filter)
+        # if --debug flag is passed, we also set our debugger on debug mode
+        if logging.getLogger("red").isEnabledFor(logging.DEBUG):
+            stdout_handler.setLevel(logging.DEBUG)
+        else:
+            stdout_handler.setLevel(logging.INFO)
+
+        return stdout_handler
+
+    def enable(self):
+        """Enable error reporting for Sentry."""
+        from .reporting import get_service
+
+        if self.sentry_handler is None:
+            self.sentry_handler = self.init_sentry()
+        get_service().register(self.cog_name)
+        self.log.addHandler(self.sentry_handler)
+        if self.summary_task is None:
+            self.summary_task = asyncio.ensure_future(self.send_summaries_loop())
+
+    def disable(self):
+        """Disable error reporting for Sentry."""
+        if self.sentry_handler is None:
+            return  # never enabled
+        if self.summary_task is not None:
+            self.summary_task.cancel()
+            self.summary_task = None
+            self.send_summaries()
+        self.log.removeHandler(self.sentry_handler)
+        loop = asyncio.get_event_loop()
+        loop.create_task(self.close())
+
+    def send_summaries(self):
+        """Report the errors that were not sent because of the deduplication or rate limit."""
+        for record in self.limiter.summaries(self.logger_name):
+            self.sentry_handler.handle(record)
+
+    async def send_summaries_loop(self):
+        while True:
+            await asyncio.sleep(self.summary_interval)
+            try:
+                self.send_summaries()
+            except Exception as e:
+                self.log.warn("Couldn't send the summary of the errors.", exc_info=e)
+
+    def enable_stdout(self):
+        self.log.addHandler(self.stdout_handler)
+
+    def disable_stdout(self):
+        self.log.removeHandler(self.stdout_handler)
+
+    def stop_file_logging(self):
+        """Write the pending logs to the file and stop the thread, call this on unload."""
+        if self.queue_listener:
+            self.log.removeHandler(self.queue_handler)
+            self.queue_listener.stop()
+            # releases the file, it stays locked on Windows otherwise
+            for handler in self.queue_listener.handlers:
+                handler.close()
+            self.queue_listener = None
+            self.queue_handler = None
+
+    async def close(self):
+        """
+        Release the reporting service for this cog.
+
+        The service sends the pending messages and shuts down if no other cog uses it.
+        """
+        if self.client is None:
+            return
+        from .reporting import get_service
+
+        await get_service().release(self.cog_name)
@@ -0,0 +1,144 @@
+import asyncio
+import aiohttp
+import logging
+
+from raven.exceptions import APIError, RateLimited
+from raven.transport.base import AsyncTransport
+
+log = logging.getLogger("laggron.utils")
+
+
+class SharedTransport(AsyncTransport):
+    """
+    A raven transport sending the events through the shared :class:`ReportingService`.
+
+    Give :func:`shared_transport` to the ``transport`` argument of a raven ``Client``.
+    """
+
+    def async_send(self, url, data, headers, success_cb, failure_cb):
+        get_service().send(url, data, headers, success_cb, failure_cb)
+
+
+class ReportingService:
+    """
+    The error reporting of all Laggron's cogs, with one connection pool and one event queue.
+
+    Each cog keeps its own raven ``Client`` since they report to different projects, but they
+    all send their events through this service. It starts when the first cog registers and is
+    closed when the last one is released.
+
+    Parameters
+    ----------
+    max_queue: int
+        The maximum number of events waiting to be sent. When full, the oldest event is dropped.
+    timeout: int
+        The timeout of a request to Sentry, in seconds.
+    """
+
+    def __init__(self, max_queue: int = 100, timeout: int = 5):
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.users = set()  # names of the registered cogs
+        self.queue = None
+        self.session = None
+        self.worker = None
+
+    @property
+    def running(self) -> bool:
+        return self.worker is not None
+
+    def register(self, name: str):
+        """Register a cog using the service, starting it if needed."""
+        self.users.add(name)
+        if not self.running:
+            self.queue = asyncio.Queue(maxsize=self.max_queue)
+            self.session = aiohttp.ClientSession()
+            self.worker = asyncio.ensure_future(self._worker(self.queue, self.session))
+            log.debug("Error reporting service started.")
+
+    async def release(self, name: str):
+        """Release the service for a cog, it is closed once no cog uses it anymore."""
+        self.users.discard(name)
+        if not self.users and self.running:
+            await self.close()
+
+    def send(self, url, data, headers, success_cb, failure_cb):
+        if not self.running:
+            failure_cb(RuntimeError("The error reporting service is closed."))
+            return
+        try:
+            self.queue.put_nowait((url, data, headers, success_cb, failure_cb))
+        except asyncio.QueueFull:
+            *_, skipped_failure_cb = self.queue.get_nowait()
+            self.queue.task_done()
+            skipped_failure_cb(RuntimeError("The error reporting queue is full."))
+            self.queue.put_nowait((url, data, headers, success_cb, failure_cb))
+
+    async def _worker(self, queue: asyncio.Queue, session: aiohttp.ClientSession):
+        while True:
+            item = await queue.get()
+            try:
+                if item is None:
+                    break
+                await self._send(session, *item)
+            finally:
+                queue.task_done()
+
+    async def _send(self, session, url, data, headers, success_cb, failure_cb):
+        # taken from raven_aiohttp
+        response = None
+        try:
+            response = await session.post(
+                url, data=data, compress=False, headers=headers, timeout=self.timeout
+            )
+            code = response.status
+            if code == 200:
+                success_cb()
+                return
+            message = response.headers.get("x-sentry-error")
+            if code == 429:
+                try:
+                    retry_after = int(response.headers.get("retry-after"))
+                except (ValueError, TypeError):
+                    retry_after = 0
+                failure_cb(RateLimited(message, retry_after))
+            else:
+                failure_cb(APIError(message, code))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            failure_cb(e)
+        finally:
+            if response is not None:
+                response.release()
+
+    async def close(self, timeout: int = 10):
+        """Send the pending events and close the connections."""
+        # the service can be started again while we're closing this one
+        worker, queue, session = self.worker, self.queue, self.session
+        self.worker = self.queue = self.session = None
+        try:
+            queue.put_nowait(None)
+        except asyncio.QueueFull:
+            # no time to lose, the pending events are dropped
+            worker.cancel()
+        try:
+            await asyncio.wait_for(worker, timeout=timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            pass
+        await session.close()
+        log.debug("Error reporting service closed.")
+
+
+_service = ReportingService()
+_transport = SharedTransport()
+
+
+def get_service() -> ReportingService:
+    """Get the reporting service shared by all cogs."""
+    return _service
+
+
+def shared_transport(**options) -> SharedTransport:
+    """Transport factory for raven ``Client``, all clients use the shared service."""
+    return _transport
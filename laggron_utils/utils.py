@@ -0,0 +1,26 @@
+import math
+import os
+
+from pathlib import Path
+from typing import List, Union
+
+
+def percentile(values: List[float], percent: float) -> float:
+    """Nearest-rank percentile of a list of values, ``0.0`` if the list is empty."""
+    if not values:
+        return 0.0
+    values = sorted(values)
+    rank = max(0, min(len(values) - 1, math.ceil(percent / 100 * len(values)) - 1))
+    return values[rank]
+
+
+def write_file(path: Path, content: Union[str, bytes]):
+    """
+    Replace the content of a file at once, so a reader never gets half of it.
+
+    This is blocking, run it in an executor from a coroutine.
+    """
+    temp_path = path.with_suffix(".tmp")
+    with temp_path.open("wb" if isinstance(content, bytes) else "w") as file:
+        file.write(content)
+    os.replace(str(temp_path), str(path))
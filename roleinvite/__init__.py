@@ -1,6 +1,8 @@
 import logging
 import asyncio
 
+from laggron_utils.cache import wait_closed
+
 from .roleinvite import RoleInvite
 from .loggers import Log
 
@@ -54,6 +56,8 @@ async def ask_enable_sentry(bot):
 async def setup(bot):
     global _
     n = RoleInvite(bot)
+    # the previous instance may still be saving its config after a reload
+    await wait_closed(n.data.driver.cog_name)
     _ = n.translator
     sentry = Log(bot, n.__version__)
     sentry.enable_stdout()
@@ -1,11 +1,23 @@
+import asyncio
 import discord
 import logging
+import re
 
 from .roleinvite import _  # translator
 from . import errors
+from .tracker import InviteTracker
 
 log = logging.getLogger("laggron.roleinvite")
 
+INVITE_URL_RE = re.compile(
+    r"^(?:https?://)?(?:www\.)?(?:discord\.gg|discord(?:app)?\.com/invite)/"
+)
+
+
+def resolve_invite(invite: str) -> str:
+    """Get the code of an invite from its URL. Anything else is returned as is."""
+    return INVITE_URL_RE.sub("", invite.strip())
+
 
 class API:
     """
@@ -31,6 +43,10 @@ class API:
     def __init__(self, bot, config):
         self.bot = bot
         self.data = config
+        self.tracker = InviteTracker()
+        self.reconciliation_limit = 10
+        self.loaded = asyncio.Event()  # the list of guilds to update is known
+        self.ready = {}  # guild ID: asyncio.Event, set once its invites were updated
 
     def escape_invite_links(self, text: str) -> str:
         """
@@ -48,12 +64,31 @@ class API:
         """
         return text.replace("://discord.gg/", "://discord.\u200Bgg/")
 
+    async def _convert_invite_urls(self):
+        """
+        Invites were stored with their URL before, they're now stored with their code only.
+        """
+        if await self.data.invite_codes():
+            return
+        for guild_id, data in (await self.data.all_guilds()).items():
+            invites = {resolve_invite(x): y for x, y in data["invites"].items()}
+            if list(invites) != list(data["invites"]):
+                await self.data.guild(discord.Object(id=guild_id)).invites.set(invites)
+        await self.data.invite_codes.set(True)
+        log.debug("Converted the invite URLs to invite codes.")
+
     async def update_invites(self) -> dict:
         """
         Update all invites registered to keep their uses count good.
 
         This is usually called on cog load since these values
         could have been modified while the bot or the cog was offline.
+        The uses are also kept in memory to find the invite used by
+        the members joining.
+
+        The guilds are updated concurrently, at most 10 at once (edit
+        ``reconciliation_limit`` to change this). Use :meth:`wait_until_ready`
+        to wait for a guild to be updated.
 
         Returns
         -------
@@ -66,45 +101,75 @@ class API:
                 if the :attr:`~discord.Permissions.manage_guild` permission was
                 lost on the guild.
         """
-        all_bot_invites = await self.data.all_guilds()
-        for guild_id in all_bot_invites:
+        try:
+            await self._convert_invite_urls()
+            all_bot_invites = await self.data.all_guilds()
+            for guild_id in all_bot_invites:
+                self.ready.setdefault(guild_id, asyncio.Event())
+        finally:
+            self.loaded.set()
+        semaphore = asyncio.Semaphore(self.reconciliation_limit)
+        await asyncio.gather(
+            *[self._update_guild_invites(semaphore, x, y) for x, y in all_bot_invites.items()]
+        )
+        return await self.data.all_guilds()
+
+    async def _update_guild_invites(self, semaphore, guild_id: int, data: dict):
+        try:
             guild = self.bot.get_guild(guild_id)
             if guild is None:
-                continue
-            bot_invites = all_bot_invites[guild.id]["invites"]
-
-            try:
-                invites = await guild.invites()
-            except discord.errors.Forbidden:
-                # manage_roles permission was removed
-                # we disable the autorole to prevent more errors
-                await self.data.guild(guild).enabled.set(False)
-                log.warning(
-                    "The manage_server permission was lost. "
-                    "RoleInvite is now disabled on this guild.\n"
-                    f"Guild: {guild.name} (ID: {guild.id})"
-                )
-                continue
-
+                return
+            async with semaphore:
+                try:
+                    invites = await guild.invites()
+                except discord.errors.Forbidden:
+                    # manage_roles permission was removed
+                    # we disable the autorole to prevent more errors
+                    await self.data.guild(guild).enabled.set(False)
+                    log.warning(
+                        "The manage_server permission was lost. "
+                        "RoleInvite is now disabled on this guild.\n"
+                        f"Guild: {guild.name} (ID: {guild.id})"
+                    )
+                    return
+            self.tracker.seed(guild, invites)
+
+            invites = self.tracker.invites[guild.id]
+            bot_invites = {}
             to_remove = []
-            for invite in bot_invites:
-                if all(invite != x for x in ["main", "default"]):
-                    invite_object = discord.utils.get(invites, url=invite)
-                    if not invite_object:
-                        to_remove.append(invite)
-                    else:
-                        await self.data.guild(guild).invites.set_raw(
-                            invite_object.url, "uses", value=invite_object.uses
-                        )
-            # removing invites to delete
-            bot_invites = {x: y for x, y in bot_invites.items() if x not in to_remove}
+            for invite, invite_data in data["invites"].items():
+                if any(invite == x for x in ["main", "default"]):
+                    bot_invites[invite] = invite_data
+                elif invite not in invites:
+                    to_remove.append(invite)
+                else:
+                    bot_invites[invite] = dict(invite_data, uses=invites[invite].uses)
             if to_remove:
                 log.debug(
                     f"Removing expired invites from guild {guild.name} (ID: {guild.id}):\n"
                     + ", ".join(to_remove)
                 )
+            if bot_invites != data["invites"]:
+                # one write for the whole guild
                 await self.data.guild(guild).invites.set(bot_invites)
-        return await self.data.all_guilds()
+        except Exception as e:
+            log.error(f"Couldn't update the invites of the guild {guild_id}.", exc_info=e)
+        finally:
+            self.ready[guild_id].set()
+
+    async def wait_until_ready(self, guild: discord.Guild):
+        """
+        Wait until the invites of the guild were updated by :meth:`update_invites`.
+
+        Parameters
+        ----------
+        guild: :class:`discord.Guild`
+            The guild to wait for.
+        """
+        await self.loaded.wait()
+        event = self.ready.get(guild.id)
+        if event is not None:
+            await event.wait()
 
     async def add_invite(self, guild: discord.Guild, invite: str, roles: list) -> bool:
         """
@@ -115,8 +180,8 @@ class API:
         guild: :class:`discord.Guild`
             The guild to get the invites from.
         invite: :py:class:`str`
-            The invite link to create/extend. Give ``main`` or ``default`` if
-            you want to edit the main/default autorole system.
+            The invite link or code to create/extend. Give ``main`` or ``default``
+            if you want to edit the main/default autorole system.
         roles: :py:class:`list`
             A list of roles ID to add to the roles list.
 
@@ -136,25 +201,27 @@ class API:
         :class:`~errors.InviteNotFound`
             The invite given doesn't exist in the guild.
         """
+        invite = resolve_invite(invite)
         invites = await self.data.guild(guild).invites()
         if roles == []:
             raise errors.EmptyRolesList("No roles to add to the invite")
 
         try:
-            guild_invite = await guild.invites()
+            guild_invites = {x.code: x for x in await guild.invites()}
         except discord.errors.Forbidden:
             raise errors.CannotGetInvites(
                 'The "Manage server" permission is needed for this function'
             )
+        # the invite may be newer than the snapshot, it would be seen as expired on the next join
+        self.tracker.update(guild, list(guild_invites.values()))
 
         if all(invite != x for x in ["default", "main"]):  # the invite given is a true invite
-            try:
-                invite_object = await self.bot.get_invite(invite)
-            except discord.errors.NotFound:
-                raise errors.NotInvite(f"Cannot get discord.Invite object from {invite}")
-
-            invite_object = discord.utils.get(guild_invite, code=invite_object.code)
+            invite_object = guild_invites.get(invite)
             if not invite_object:
+                try:
+                    await self.bot.get_invite(invite)
+                except discord.errors.NotFound:
+                    raise errors.NotInvite(f"Cannot get discord.Invite object from {invite}")
                 raise errors.InviteNotFound("The invite given doesn't exist in that guild")
 
         if invite not in invites:
@@ -167,6 +234,84 @@ class API:
             await self.data.guild(guild).invites.set_raw(invite, "uses", value=invite_object.uses)
         return True
 
+    async def set_invite_roles_bulk(self, guild: discord.Guild, invites: dict) -> dict:
+        """
+        Set the roles linked to many invites at once.
+
+        Unlike :meth:`add_invite`, the roles given replace the roles already linked to the
+        invite. All invites are checked with a single fetch of the guild's invites, then
+        saved with a single write. If one of them is invalid, nothing is saved.
+
+        Parameters
+        ----------
+        guild: :class:`discord.Guild`
+            The guild to get the invites from.
+        invites: :py:class:`dict`
+            The invite links or codes with the :py:class:`list` of roles ID to link to them.
+            Give ``main`` or ``default`` to edit the main/default autorole system. Give an
+            empty list to remove an invite from the autorole system.
+
+        Returns
+        -------
+        dict
+            The new invites linked to the autorole system, like :meth:`get_invites`.
+
+        Raises
+        ------
+        :class:`~errors.CannotGetInvites`
+            The bot doesn't have the permission to get the guild's invites
+        :class:`~errors.InviteNotFound`
+            Some of the invites given don't exist in the guild.
+        :class:`~errors.CannotAddRole`
+            Some of the roles given don't exist in the guild, or are above or equal to the
+            bot's highest role.
+        """
+        new_invites = {resolve_invite(x): list(y) for x, y in invites.items()}
+        guild_roles = {x.id: x for x in guild.roles}
+        role_ids = {x for y in new_invites.values() for x in y}
+        not_found = [str(x) for x in role_ids if x not in guild_roles]
+        if not_found:
+            raise errors.CannotAddRole(
+                "The following roles don't exist in that guild: " + ", ".join(not_found)
+            )
+        too_high = [
+            f"{guild_roles[x].name} (ID: {x})"
+            for x in role_ids
+            if guild_roles[x].position >= guild.me.top_role.position
+        ]
+        if too_high:
+            raise errors.CannotAddRole(
+                "The following roles are above or equal to my highest role: " + ", ".join(too_high)
+            )
+        guild_invites = {}
+        if any(x not in ["default", "main"] for x in new_invites):
+            try:
+                guild_invites = {x.code: x for x in await guild.invites()}
+            except discord.errors.Forbidden:
+                raise errors.CannotGetInvites(
+                    'The "Manage server" permission is needed for this function'
+                )
+            self.tracker.update(guild, list(guild_invites.values()))
+            not_found = [
+                x for x in new_invites if x not in ["default", "main"] and x not in guild_invites
+            ]
+            if not_found:
+                raise errors.InviteNotFound(
+                    "The following invites don't exist in that guild: " + ", ".join(not_found)
+                )
+
+        bot_invites = await self.data.guild(guild).invites()
+        for invite, roles in new_invites.items():
+            if not roles:
+                bot_invites.pop(invite, None)
+                continue
+            invite_data = bot_invites.setdefault(invite, {"roles": [], "uses": None})
+            invite_data["roles"] = roles
+            if invite in guild_invites:
+                invite_data["uses"] = guild_invites[invite].uses
+        await self.data.guild(guild).invites.set(bot_invites)
+        return bot_invites
+
     async def remove_invite(self, guild: discord.Guild, invite: str, roles: list = []) -> bool:
         """
         Remove a :py:class:`list` of roles from the invite links.
@@ -179,8 +324,8 @@ class API:
             A : py:class:`list` of roles ID to remove from the roles list. If it's empty, it will
             remove the invite from the autorole system.
         invite: :py:class`str`
-            The invite to remove roles from. Give `main` or `default` to edit the main/default
-            autorole system.
+            The invite link or code to remove roles from. Give `main` or `default` to edit the
+            main/default autorole system.
 
         Returns
         -------
@@ -192,6 +337,7 @@ class API:
             The invite given doesn't exist.
         """
 
+        invite = resolve_invite(invite)
         invites = await self.data.guild(guild).invites()
 
         if invite not in invites:
@@ -229,7 +375,7 @@ class API:
         Returns
         -------
         dict
-            A :py:class:`dict` of invites linked to any role on the guild.
+            A :py:class:`dict` of invites linked to any role on the guild, with their code.
 
             Example
 
@@ -241,7 +387,7 @@ class API:
                             987654321234567890
                         ]
                     },
-                    "https://discord.gg/example" : {
+                    "example" : {
                         "roles" : [
                             012345678987654321,
                             987654321234567890
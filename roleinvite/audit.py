@@ -0,0 +1,85 @@
+import json
+import time
+
+from collections import Counter, deque
+from pathlib import Path
+
+from laggron_utils.utils import percentile, write_file
+
+# the stages of a join, in order
+STAGES = ("ready", "config", "invites", "roles")
+
+
+class JoinAudit:
+    """
+    Keep the last joins handled by the autorole system of each guild in memory.
+
+    Each join is saved with the attribution outcome and the time spent in each stage:
+
+    *   ``ready``: waiting for the invites of the guild to be updated on load
+    *   ``config``: reading the linked invites
+    *   ``invites``: fetching the invites to find the one used
+    *   ``roles``: checking and giving the roles, including the time in the queue
+
+    The outcome is ``invite`` (matched with a linked invite), ``ambiguous``, ``main``,
+    ``default`` (only the default roles given) or ``none``.
+
+    Parameters
+    ----------
+    size: int
+        The number of joins kept for each guild, the oldest are forgotten.
+    """
+
+    def __init__(self, size: int = 500):
+        self.size = size
+        self.joins = {}  # guild ID: deque of dict
+
+    def record(self, member, outcome: str, invite: str, given: bool, timings: dict):
+        joins = self.joins.setdefault(member.guild.id, deque(maxlen=self.size))
+        joins.append(
+            {
+                "time": time.time(),
+                "member": member.id,
+                "outcome": outcome,
+                "invite": invite,
+                "given": given,
+                "timings": timings,
+            }
+        )
+
+    def summary(self, guild) -> dict:
+        """
+        Summarize the joins kept for a guild.
+
+        Returns
+        -------
+        dict
+            ``joins``: the number of joins, ``outcomes``: a :py:class:`~collections.Counter` of
+            the outcomes, ``failed``: the number of joins that didn't get their roles and
+            ``timings``: ``{stage: (p50, p99, max)}`` in seconds, the total included.
+        """
+        joins = self.joins.get(guild.id, [])
+        timings = {}
+        for stage in STAGES + ("total",):
+            if stage == "total":
+                values = [sum(x["timings"].values()) for x in joins]
+            else:
+                values = [x["timings"].get(stage, 0.0) for x in joins]
+            timings[stage] = (
+                percentile(values, 50),
+                percentile(values, 99),
+                max(values) if values else 0.0,
+            )
+        return {
+            "joins": len(joins),
+            "outcomes": Counter(x["outcome"] for x in joins),
+            "failed": sum(1 for x in joins if not x["given"]),
+            "timings": timings,
+        }
+
+    def export(self, guild, path: Path):
+        """
+        Write the joins kept for a guild in a JSON file. This is blocking, run it in an
+        executor.
+        """
+        write_file(path, json.dumps(list(self.joins.get(guild.id, [])), indent=2))
@@ -0,0 +1,128 @@
+import asyncio
+import discord
+import logging
+import time
+
+from collections import Counter
+
+log = logging.getLogger("laggron.roleinvite")
+
+
+class AutoroleQueue:
+    """
+    Give the autoroles of each guild at the pace allowed by Discord.
+
+    discord.py already waits for the rate limit buckets and retries when a request is rate
+    limited, but gives up after a few attempts. During a raid, this would make members miss
+    their roles. Up to ``concurrency`` members of a guild get their roles at once, the others
+    wait for their turn. Nothing is slowed down until Discord answers with a 429 (or an
+    error). The guild's requests are then paused, the pause being doubled with each new 429,
+    and the member is tried again. The pause goes back to 0 with the next successes.
+
+    Parameters
+    ----------
+    max_attempts: int
+        The number of times a member is tried before giving up.
+    max_delay: float
+        The maximum pause after a 429, in seconds.
+    concurrency: int
+        The number of members of a guild getting their roles at once. discord.py holds the
+        extra requests until the bucket resets.
+
+    Attributes
+    ----------
+    delays: dict
+        Guild ID: current pause after a 429, in seconds.
+    lags: dict
+        Guild ID: time spent waiting for its turn by the last member processed, in seconds.
+    retries: int
+        The number of members retried after a 429 or a Discord error since load.
+    rate_limited: collections.Counter
+        Guild ID: number of 429 received since load.
+    failures: int
+        The number of members who didn't get their roles since load.
+    """
+
+    def __init__(self, max_attempts: int = 5, max_delay: float = 10, concurrency: int = 10):
+        self.max_attempts = max_attempts
+        self.max_delay = max_delay
+        self.concurrency = concurrency
+        self.semaphores = {}
+        self.waiting = Counter()
+        self.paused_until = {}
+        self.delays = {}
+        self.lags = {}
+        self.retries = 0
+        self.rate_limited = Counter()
+        self.failures = 0
+
+    def depth(self, guild: discord.Guild) -> int:
+        """The number of members waiting for their turn in the guild."""
+        return self.waiting[guild.id]
+
+    async def add_roles(self, member: discord.Member, roles: list, reason: str) -> bool:
+        """
+        Give the roles to a member once it's their turn.
+
+        Returns
+        -------
+        bool
+            :py:obj:`True` if the roles were given.
+        """
+        guild = member.guild
+        semaphore = self.semaphores.get(guild.id)
+        if semaphore is None:
+            semaphore = self.semaphores[guild.id] = asyncio.Semaphore(self.concurrency)
+        queued_at = time.monotonic()
+        self.waiting[guild.id] += 1
+        try:
+            await semaphore.acquire()
+        finally:
+            self.waiting[guild.id] -= 1
+        try:
+            self.lags[guild.id] = time.monotonic() - queued_at
+            return await self._give(member, roles, reason)
+        finally:
+            semaphore.release()
+
+    async def _give(self, member: discord.Member, roles: list, reason: str) -> bool:
+        guild = member.guild
+        for attempt in range(self.max_attempts):
+            pause = self.paused_until.get(guild.id, 0) - time.monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+            try:
+                await member.add_roles(*roles, reason=reason)
+            except discord.errors.NotFound:
+                return False  # the member left
+            except discord.errors.HTTPException as e:
+                if e.status != 429 and e.status < 500:
+                    self.failures += 1
+                    log.warning(
+                        f"Couldn't give the autoroles to {member} (ID: {member.id}).\n"
+                        f"Guild: {guild.name} (ID: {guild.id})",
+                        exc_info=e,
+                    )
+                    return False
+                # rate limited or Discord error, pause the guild and try again
+                self.retries += 1
+                if e.status == 429:
+                    self.rate_limited[guild.id] += 1
+                now = time.monotonic()
+                if self.paused_until.get(guild.id, 0) <= now:
+                    # the concurrent requests failing during the pause don't extend it
+                    delay = min(max(self.delays.get(guild.id, 0) * 2, 0.5), self.max_delay)
+                    self.delays[guild.id] = delay
+                    self.paused_until[guild.id] = now + delay
+            else:
+                delay = self.delays.get(guild.id, 0)
+                if delay:
+                    self.delays[guild.id] = delay / 2 if delay > 0.05 else 0
+                return True
+        self.failures += 1
+        log.warning(
+            f"Couldn't give the autoroles to {member} (ID: {member.id}) after "
+            f"{self.max_attempts} attempts, Discord is rate limiting the bot.\n"
+            f"Guild: {guild.name} (ID: {guild.id})"
+        )
+        return False
@@ -1,6 +1,7 @@
 # RoleInvite by retke, aka El Laggron
 import asyncio
 import logging
+import time
 import discord
 
 from typing import TYPE_CHECKING
@@ -8,14 +9,19 @@ from typing import TYPE_CHECKING
 from redbot.core import commands
 from redbot.core import Config
 from redbot.core import checks
+from redbot.core.data_manager import cog_data_path
 from redbot.core.i18n import cog_i18n, Translator
 from redbot.core.utils.predicates import MessagePredicate
-from redbot.core.utils.chat_formatting import pagify
+from redbot.core.utils.chat_formatting import box, pagify
+
+from laggron_utils.cache import CachedDriver
 
 # creating this before importing other modules allows to import the translator
 _ = Translator("RoleInvite", __file__)
 
-from .api import API
+from .api import API, resolve_invite
+from .audit import JoinAudit, STAGES
+from .autoroles import AutoroleQueue
 from . import errors
 
 if TYPE_CHECKING:
@@ -34,7 +40,7 @@ class RoleInvite(BaseCog):
     Full documentation and FAQ: https://laggrons-dumb-cogs.readthedocs.io/roleinvite.html
     """
 
-    def_global = {"enable_sentry": None}
+    def_global = {"enable_sentry": None, "invite_codes": False}
     def_guild = {"invites": {}, "enabled": False}
 
     def __init__(self, bot):
@@ -43,11 +49,17 @@ class RoleInvite(BaseCog):
         self.data = Config.get_conf(self, 260)
         self.data.register_global(**self.def_global)
         self.data.register_guild(**self.def_guild)
+        # the invites are read on each member join, and the writes of a raid are merged
+        self.data.driver = CachedDriver(self.data.driver, write_behind=1)
 
         self.api = API(bot, self.data)
         self.errors = errors
         self.sentry = None
         self.translator = _
+        # guild ID: {(invite, role IDs): roles that can be given}
+        self.roles_cache = {}
+        self.autoroles = AutoroleQueue()
+        self.audit = JoinAudit()
 
         bot.loop.create_task(self.api.update_invites())
 
@@ -166,7 +178,7 @@ class RoleInvite(BaseCog):
             await ctx.send(_("I need the `Manage roles` permission!"))
             return
 
-        guild_invites = await ctx.guild.invites()
+        guild_invites = {x.code: x for x in await ctx.guild.invites()}
         try:
             invite = await commands.InviteConverter.convert(self, ctx, invite)
         except (commands.BadArgument, IndexError):
@@ -205,17 +217,16 @@ class RoleInvite(BaseCog):
             )
             return
         # invite is not "main" or "default", we try to find the invite
-        for guild_invite in guild_invites:
-            if invite.url == guild_invite.url:
-                if not await roles_iteration(invite.url):
-                    return
-                await self.api.add_invite(ctx.guild, invite.url, [role.id])
-                await ctx.send(
-                    _("The role `{}` is now linked to the invite `{}`").format(
-                        role.name, self.api.escape_invite_links(invite.url)
-                    )
-                )
+        if invite.code in guild_invites:
+            if not await roles_iteration(invite.code):
                 return
+            await self.api.add_invite(ctx.guild, invite.code, [role.id])
+            await ctx.send(
+                _("The role `{}` is now linked to the invite `{}`").format(
+                    role.name, self.api.escape_invite_links(invite.url)
+                )
+            )
+            return
         # not "main", "default" or an invite for the guild
         await ctx.send(_("That invite cannot be found"))
 
@@ -230,8 +241,7 @@ class RoleInvite(BaseCog):
         `main`/`default` instead of a discord invite.
         """
         invites = await self.data.guild(ctx.guild).invites()
-        invites = {x.split("/")[-1]: y for x, y in invites.items()}  # removes https://discord.gg/
-        invite = invite.split("/")[-1]  # also removes https://discord.gg
+        invite = resolve_invite(invite)  # removes https://discord.gg/
         bot_invite = invites.get(invite)
         if not bot_invite:
             await ctx.send(_("That invite cannot be found"))
@@ -242,7 +252,7 @@ class RoleInvite(BaseCog):
             roles = [discord.utils.get(ctx.guild.roles, id=x) for x in bot_invite["roles"]]
             roles = [x for x in roles if x]  # removes deleted roles
             if not roles:  # no more roles after cleaning
-                await self.api.remove_invite(ctx.guild, f"http://discord.gg/{invite}")
+                await self.api.remove_invite(ctx.guild, invite)
                 await ctx.send(_("That invite lost all of its linked roles and was deleted."))
                 return
 
@@ -268,10 +278,10 @@ class RoleInvite(BaseCog):
                 await ctx.send(_("Alright, invite is kept."))
                 return
 
-            await self.api.remove_invite(ctx.guild, invite=f"http://discord.gg/{invite}")
+            await self.api.remove_invite(ctx.guild, invite=invite)
             await ctx.send(
                 _("The invite `{}` has been removed from the list.").format(
-                    self.api.escape_invite_links(f"http://discord.gg/{invite}")
+                    self.api.escape_invite_links(f"https://discord.gg/{invite}")
                 )
             )
 
@@ -282,7 +292,9 @@ class RoleInvite(BaseCog):
             elif invite == "default":
                 message = _("default autorole.")
             else:
-                message = _("invite `{}`.").format(self.api.escape_invite_links(invite))
+                message = _("invite `{}`.").format(
+                    self.api.escape_invite_links(f"https://discord.gg/{invite}")
+                )
             await ctx.send(
                 _("You're about to unlink the `{}` role from the {}\nProceed? (yes/no)").format(
                     role.name, message
@@ -310,13 +322,24 @@ class RoleInvite(BaseCog):
             await ctx.send("I need the `Embed links` permission.")
             return
 
+        codes = [x for x in invites if x not in ["default", "main"]]
+        try:
+            guild_invites = await ctx.guild.invites()
+        except discord.errors.HTTPException:
+            # no permission or rate limited, each invite is checked instead
+            results = await asyncio.gather(
+                *[self.bot.get_invite(x) for x in codes], return_exceptions=True
+            )
+            existing = {
+                x for x, y in zip(codes, results) if not isinstance(y, discord.errors.NotFound)
+            }
+        else:
+            existing = {x.code for x in guild_invites}
+        to_delete.extend(x for x in codes if x not in existing)  # if the invite got deleted
+
         for i, invite in invites.items():
-            if all(i != x for x in ["default", "main"]):
-                try:
-                    await self.bot.get_invite(i)
-                except discord.errors.NotFound:
-                    to_delete.append(i)  # if the invite got deleted
-                    continue
+            if i in to_delete:
+                continue
             roles = []
             for role in invites[i]["roles"]:
                 role = discord.utils.get(ctx.guild.roles, id=role)
@@ -332,7 +355,7 @@ class RoleInvite(BaseCog):
             elif i == "main":
                 text += f"{_('Roles linked to the main autorole')}:\n+ {roles_names}\n\n"
             else:
-                i = self.api.escape_invite_links(i)
+                i = self.api.escape_invite_links(f"https://discord.gg/{i}")
                 text += f"{_('Roles linked to')} {i}:\n+ {roles_names}\n\n"
 
         for deletion in to_delete:
@@ -387,6 +410,63 @@ class RoleInvite(BaseCog):
                 ).format(ctx)
             )
 
+    @inviteset.command()
+    @checks.is_owner()
+    async def stats(self, ctx, export: str = None):
+        """
+        Show how the last joins of this server were handled.
+
+        Type `export` after your command to write the last joins in a file.
+        """
+        guild = ctx.guild
+        if export is not None and "export" in export:
+            path = cog_data_path(self) / f"joins-{guild.id}.json"
+            # writing is done in another thread to not block the bot
+            await self.bot.loop.run_in_executor(None, self.audit.export, guild, path)
+            await ctx.send(
+                _("The last joins were written in the following file:\n`{path}`").format(path=path)
+            )
+            return
+        summary = self.audit.summary(guild)
+        if not summary["joins"]:
+            await ctx.send(_("No member joined since the cog was loaded."))
+            return
+        stage_names = {
+            "ready": _("startup"),
+            "config": _("config"),
+            "invites": _("invite fetch"),
+            "roles": _("roles"),
+            "total": _("total"),
+        }
+        text = _("Last {joins} joins, {failed} without their roles.").format(**summary) + "\n\n"
+        text += f"{_('stage'):<14} {_('p50 (ms)'):>9} {_('p99 (ms)'):>9} {_('max (ms)'):>9}\n"
+        for stage, (p50, p99, maximum) in summary["timings"].items():
+            text += (
+                f"{stage_names[stage]:<14} {p50 * 1000:>9.1f} {p99 * 1000:>9.1f} "
+                f"{maximum * 1000:>9.1f}\n"
+            )
+        outcomes = {
+            "invite": _("linked invite"),
+            "ambiguous": _("ambiguous"),
+            "main": _("main"),
+            "default": _("default only"),
+            "none": _("no roles"),
+        }
+        text += "\n"
+        for outcome, name in outcomes.items():
+            text += f"{name:<24} {summary['outcomes'][outcome]:>7}\n"
+        rate_limits = (
+            self.api.tracker.rate_limited[guild.id] + self.autoroles.rate_limited[guild.id]
+        )
+        text += (
+            f"\n{_('invite fetches'):<24} {self.api.tracker.fetches[guild.id]:>7}\n"
+            f"{_('rate limits'):<24} {rate_limits:>7}\n"
+            f"{_('queued members'):<24} {self.autoroles.depth(guild):>7}\n"
+            f"{_('queue lag (ms)'):<24} {self.autoroles.lags.get(guild.id, 0) * 1000:>7.0f}"
+        )
+        for page in pagify(text, page_length=1980):
+            await ctx.send(box(page))
+
     @commands.command(hidden=True)
     @checks.is_owner()
     async def roleinviteinfo(self, ctx, sentry: str = None):
@@ -449,16 +529,38 @@ class RoleInvite(BaseCog):
         await ctx.send(message)
 
     async def on_member_join(self, member):
-        async def add_roles(invite):
+        async def add_roles(invite, ambiguous=False):
             invites_data = bot_invites[invite]
-            if invite == "main":
+            if ambiguous:
+                reason = _("The invite used couldn't be found, main roles given.")
+            elif invite == "main":
                 reason = _("Joined with an unknown invite, main roles given.")
             elif invite == "default":
                 reason = _("Default roles given.")
             else:
-                reason = _("Joined with {}").format(invite)
+                reason = _("Joined with {}").format(f"https://discord.gg/{invite}")
+
+            # let's check if the request can be done before calling the API
+            if not member.guild.me.guild_permissions.manage_roles:
+                # manage_roles permission was removed
+                # we disable the autorole to prevent more errors
+                await self.data.guild(guild).enabled.set(False)
+                log.warning(
+                    'The "Manage roles" permission was lost. '
+                    "RoleInvite is now disabled on this guild.\n"
+                    f"Guild: {guild.name} (ID: {guild.id})"
+                )
+                return False
 
             roles_data = invites_data["roles"]
+            cache = self.roles_cache.setdefault(guild.id, {})
+            roles = cache.get((invite, tuple(roles_data)))
+            if roles is not None and all(x.position < guild.me.top_role.position for x in roles):
+                # already checked, and still below the bot's highest role
+                return await self.autoroles.add_roles(
+                    member, roles, _("Roleinvite autorole. ") + reason
+                )
+
             roles = []  # roles object to add to the member
             to_remove = []  # lost roles
             for role_id in roles_data:
@@ -474,31 +576,13 @@ class RoleInvite(BaseCog):
                     f"Roles ID: {roles_id_str}\n"
                     f"Guild: {guild.name} (ID: {guild.id})"
                 )
-                await self.data.guild(guild).invites.set_raw(
-                    invite, "roles", value=[x for x in roles_data if x not in to_remove]
-                )
 
-            # let's check if the request can be done before calling the API
-            if not member.guild.me.guild_permissions.manage_roles:
-                # manage_roles permission was removed
-                # we disable the autorole to prevent more errors
-                await self.data.guild(guild).enabled.set(False)
-                log.warning(
-                    'The "Manage roles" permission was lost. '
-                    "RoleInvite is now disabled on this guild.\n"
-                    f"Guild: {guild.name} (ID: {guild.id})"
-                )
-                return False
-            to_remove = []
-            for role in roles:
-                if role.position >= guild.me.top_role.position:
-                    # The role is above or equal to the bot's highest role in the hierarchy
-                    # we're removing this role from the list to prevent more errors
-                    to_remove.append(role)
-            if to_remove != []:
-                roles = [x for x in invites_data["roles"] if x not in [x.id for x in to_remove]]
-                await self.data.guild(guild).invites.set_raw(invite, "roles", value=roles)
-                roles_str = "; ".join([f"{x.name} (ID: {x.id})" for x in to_remove])
+            # the roles above or equal to the bot's highest role in the hierarchy can't be
+            # given, we're removing them from the list to prevent more errors
+            too_high = [x for x in roles if x.position >= guild.me.top_role.position]
+            if too_high:
+                roles = [x for x in roles if x not in too_high]
+                roles_str = "; ".join([f"{x.name} (ID: {x.id})" for x in too_high])
                 log.warning(
                     f"Some roles linked to {invite} were removed because the role "
                     "hierarchy has changed and the roles are upper than mine.\n"
@@ -506,75 +590,134 @@ class RoleInvite(BaseCog):
                     f"Roles removed: {roles_str}\n"
                     f"Guild: {guild.name} (ID: {guild.id})"
                 )
-            if invites_data["roles"] == []:
+            if not roles:
                 # all roles were removed due to the checks
-                del bot_invites[invite]
-                await self.data.guild(guild).invites.set(bot_invites)
+                await self.data.guild(guild).invites.clear_raw(invite)
                 log.warning(
                     f"Invite {invite} was removed due to missing roles.\n"
                     f"Guild: {guild.name} (ID: {guild.id})"
                 )
                 return False
+            if to_remove or too_high:
+                # one write for both checks
+                await self.data.guild(guild).invites.set_raw(
+                    invite, "roles", value=[x.id for x in roles]
+                )
+            # valid until the roles of the guild or the bot change
+            cache[(invite, tuple(x.id for x in roles))] = roles
 
-            await member.add_roles(*roles, reason=_("Roleinvite autorole. ") + reason)
-            return True
+            # paced with the other joins of the guild
+            return await self.autoroles.add_roles(
+                member, roles, _("Roleinvite autorole. ") + reason
+            )
 
         guild = member.guild
         if not await self.data.guild(guild).enabled():
             return  # autorole disabled
-        bot_invites = await self.data.guild(guild).invites()
+        # time spent in each stage, for [p]inviteset stats
+        timings = {x: 0.0 for x in STAGES}
+        last = time.perf_counter()
 
-        try:
-            guild_invites = await guild.invites()
-        except discord.errors.Forbidden:
-            # manage guild permission removed
-            # we disable the autorole to prevent more errors
-            await self.data.guild(guild).enabled.set(False)
-            log.warning(
-                'The "Manage server" permission was lost. '
-                "RoleInvite is now disabled on this guild.\n"
-                f"Guild: {guild.name} (ID: {guild.id})"
-            )
-            return
+        def lap(stage: str):
+            nonlocal last
+            now = time.perf_counter()
+            timings[stage] += now - last
+            last = now
 
-        if "default" in bot_invites:
-            if not await add_roles("default"):
+        outcome, invite, given = "none", None, True
+        try:
+            # the invites must be checked after the downtime before comparing them
+            await self.api.wait_until_ready(guild)
+            lap("ready")
+
+            registered = [
+                x for x in await self.data.guild(guild).invites() if x not in ["default", "main"]
+            ]
+            lap("config")
+            fetched = True
+            try:
+                # the joins received at the same time share the same fetch
+                invite, ambiguous = await self.api.tracker.attribute(member, registered)
+            except discord.errors.Forbidden:
+                # manage guild permission removed
+                # we disable the autorole to prevent more errors
+                await self.data.guild(guild).enabled.set(False)
+                log.warning(
+                    'The "Manage server" permission was lost. '
+                    "RoleInvite is now disabled on this guild.\n"
+                    f"Guild: {guild.name} (ID: {guild.id})"
+                )
                 return
+            except discord.errors.HTTPException as e:
+                # rate limited or Discord error, the invite can't be known
+                log.warning(
+                    f"Couldn't fetch the invites to find the one used by {member} "
+                    f"(ID: {member.id}), main roles will be given.\n"
+                    f"Guild: {guild.name} (ID: {guild.id})",
+                    exc_info=e,
+                )
+                invite, ambiguous, fetched = None, True, False
+            lap("invites")
+            bot_invites = await self.data.guild(guild).invites()
+            lap("config")
+
+            if "default" in bot_invites:
+                outcome = "default"
+                given = await add_roles("default")
+                if not given:
+                    return
 
-        for invite in bot_invites:
-
-            if any(invite == x for x in ["default", "main"]):
-                continue
-
-            invite = discord.utils.get(guild_invites, url=invite)
-            if not invite:
-                del bot_invites[invite.url]
-                await self.data.guild(guild).invites.set(bot_invites)
+            # the snapshot is outdated if the invites couldn't be fetched
+            expired = [
+                x
+                for x in bot_invites
+                if fetched
+                and x not in ["default", "main"]
+                and not self.api.tracker.has_invite(guild, x)
+            ]
+            if expired:
+                for x in expired:
+                    del bot_invites[x]
+                    await self.data.guild(guild).invites.clear_raw(x)
                 log.warning(
-                    f"Invite {invite} is expired and was removed.\n"
+                    f"Invites {', '.join(expired)} are expired and were removed.\n"
                     f"Guild: {guild.name} (ID: {guild.id})"
                 )
-            else:
-                if invite.uses > bot_invites[invite.url]["uses"]:
-                    # the invite has more uses than what we registered before
-                    # this is the one used by the member
-
-                    if not await add_roles(invite.url):
-                        return
 
-                    await self.data.guild(guild).invites.set_raw(
-                        invite.url, "uses", value=invite.uses
-                    )
-                    return  # so it won't add "main" roles
-
-        if "main" in bot_invites:
-            if not await add_roles("main"):
-                return
+            if invite in bot_invites:
+                outcome = "invite"
+                given = await add_roles(invite)
+                return  # so it won't add "main" roles
+
+            if ambiguous:
+                outcome = "ambiguous"
+            if "main" in bot_invites:
+                if not ambiguous:
+                    outcome = "main"
+                given = await add_roles("main", ambiguous)
+        finally:
+            lap("roles")
+            self.audit.record(member, outcome, invite, given, timings)
+
+    async def on_guild_role_delete(self, role):
+        self.roles_cache.pop(role.guild.id, None)
+
+    async def on_guild_role_update(self, before, after):
+        self.roles_cache.pop(after.guild.id, None)
+
+    async def on_member_update(self, before, after):
+        if after.id == self.bot.user.id and before.roles != after.roles:
+            self.roles_cache.pop(after.guild.id, None)
+
+    async def on_invite_create(self, invite):
+        if invite.guild is not None:
+            self.api.tracker.on_invite_create(invite)
+
+    async def on_invite_delete(self, invite):
+        if invite.guild is not None:
+            self.api.tracker.on_invite_delete(invite)
 
     # error handling
-    def _set_context(self, data):
-        self.sentry.client.extra_context(data)
-
     async def on_command_error(self, ctx, error):
         if not isinstance(error, commands.CommandInvokeError):
             return
@@ -590,14 +733,16 @@ class RoleInvite(BaseCog):
         }
         if ctx.guild:
             context["guild"] = f"{ctx.guild.name} (ID: {ctx.guild.id})"
-        self._set_context(context)
-        self.sentry.disable_stdout()  # remove console output since Red already handle this
+        # the context is attached to this record only, and the console output is skipped
+        # since Red already handles this
         log.error(
-            f"Exception in command '{ctx.command.qualified_name}'.\n\n", exc_info=error.original
+            f"Exception in command '{ctx.command.qualified_name}'.\n\n",
+            exc_info=error.original,
+            extra={"data": context, "no_stdout": True},
         )
-        self.sentry.enable_stdout()  # re-enable console output for warnings
-        self._set_context({})  # remove context for future logs
 
     def __unload(self):
         self.sentry.disable()
         log.handlers = []
+        self.sentry.stop_file_logging()
+        self.data.driver.schedule_close()
@@ -0,0 +1,188 @@
+import asyncio
+import discord
+import logging
+import time
+
+from collections import Counter
+from datetime import datetime
+
+log = logging.getLogger("laggron.roleinvite")
+
+
+class InviteTracker:
+    """
+    Keep the uses of the invites of each guild in memory, and find the invite used by the
+    members joining without fetching all invites on each join.
+
+    The snapshots are seeded on load, updated by the ``on_invite_create`` and
+    ``on_invite_delete`` events when the library dispatches them, and refreshed by
+    :meth:`attribute`.
+
+    The joins are queued per guild. Only one fetch of the invites runs at a time for a guild,
+    at most once every ``window`` seconds, and it serves all the joins queued before it
+    started. The new uses found are given to these joins when they all come from the same
+    invite. When they can't be told apart (members of the same batch joined with different
+    invites), the joins are marked as ambiguous.
+
+    Parameters
+    ----------
+    window: float
+        The minimum time between two fetches of the invites of a guild, in seconds.
+
+    Attributes
+    ----------
+    snapshots: dict
+        Guild ID: {invite code: uses} of the last fetch.
+    invites: dict
+        Guild ID: {invite code: :class:`discord.Invite`} of the last fetch.
+    unclaimed: dict
+        Guild ID: :py:class:`~collections.Counter` of the new uses not attributed to a member
+        yet. Those are the uses of members whose join wasn't received before the fetch.
+    fetches: collections.Counter
+        Guild ID: number of invite fetches done since load.
+    rate_limited: collections.Counter
+        Guild ID: number of invite fetches that failed with a 429 since load.
+    """
+
+    def __init__(self, window: float = 0.5):
+        self.window = window
+        self.snapshots = {}
+        self.invites = {}
+        self.unclaimed = {}
+        self.queues = {}  # guild ID: list of (joined_at, member ID, future)
+        self.locks = {}
+        self.last_fetch = {}
+        self.fetches = Counter()
+        self.rate_limited = Counter()
+
+    def seed(self, guild: discord.Guild, invites: list):
+        """Replace the snapshot of a guild with a list of :class:`discord.Invite` just fetched."""
+        self.invites[guild.id] = {x.code: x for x in invites}
+        self.snapshots[guild.id] = {x.code: x.uses or 0 for x in invites}
+        self.unclaimed[guild.id] = Counter()
+
+    def update(self, guild: discord.Guild, invites: list):
+        """
+        Add the new invites of a list of :class:`discord.Invite` just fetched to the snapshot.
+
+        The uses of the invites already known are not updated, they belong to the next joins.
+        """
+        snapshot = self.snapshots.get(guild.id)
+        if snapshot is None:
+            self.seed(guild, invites)
+            return
+        for invite in invites:
+            if invite.code not in snapshot:
+                snapshot[invite.code] = invite.uses or 0
+                self.invites[guild.id][invite.code] = invite
+
+    def on_invite_create(self, invite: discord.Invite):
+        snapshot = self.snapshots.get(invite.guild.id)
+        if snapshot is not None:
+            snapshot[invite.code] = invite.uses or 0
+            self.invites[invite.guild.id][invite.code] = invite
+
+    def on_invite_delete(self, invite: discord.Invite):
+        snapshot = self.snapshots.get(invite.guild.id)
+        if snapshot is not None:
+            snapshot.pop(invite.code, None)
+            self.invites[invite.guild.id].pop(invite.code, None)
+            self.unclaimed[invite.guild.id].pop(invite.code, None)
+
+    def has_invite(self, guild: discord.Guild, code: str) -> bool:
+        """Tell if an invite exists on the guild, according to the snapshot."""
+        snapshot = self.snapshots.get(guild.id)
+        return snapshot is None or code in snapshot
+
+    async def attribute(self, member: discord.Member, registered) -> tuple:
+        """
+        Find the invite used by a member who just joined.
+
+        Parameters
+        ----------
+        member: discord.Member
+            The member who joined.
+        registered
+            The codes of the invites linked to the autorole system. The uses of the other
+            invites are the same as an unknown invite.
+
+        Returns
+        -------
+        tuple
+            ``(invite, ambiguous)``. ``invite`` is the code of the registered invite used, or
+            :py:obj:`None` if it is unknown. ``ambiguous`` is :py:obj:`True` if the member
+            may have used a registered invite, but which one can't be told.
+
+        Raises
+        ------
+        discord.errors.Forbidden
+            The bot lost the permission to fetch the invites.
+        """
+        guild = member.guild
+        future = asyncio.get_event_loop().create_future()
+        queue = self.queues.setdefault(guild.id, [])
+        queue.append((member.joined_at or datetime.utcnow(), member.id, future))
+        if len(queue) == 1:
+            # first join of the batch
+            asyncio.ensure_future(self._process(guild, set(registered)))
+        # a cancelled join must not cancel the attribution of the others
+        return await asyncio.shield(future)
+
+    async def _process(self, guild: discord.Guild, registered: set):
+        lock = self.locks.setdefault(guild.id, asyncio.Lock())
+        async with lock:
+            delay = self.last_fetch.get(guild.id, 0) + self.window - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            # the joins received from now on may not be counted by this fetch
+            batch = sorted(self.queues.pop(guild.id), key=lambda x: x[:2])
+            try:
+                self.fetches[guild.id] += 1
+                invites = await guild.invites()
+                results = self._spread(guild, invites, len(batch), registered)
+            except Exception as e:
+                if isinstance(e, discord.errors.HTTPException) and e.status == 429:
+                    self.rate_limited[guild.id] += 1
+                for *_, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+            finally:
+                self.last_fetch[guild.id] = time.monotonic()
+            for (*_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+    def _spread(self, guild: discord.Guild, invites: list, joins: int, registered: set) -> list:
+        """Diff the snapshots and attribute the new uses to the given number of joins."""
+        snapshot = self.snapshots.get(guild.id)
+        if snapshot is None:
+            # nothing to compare with, the guild wasn't configured when seeding
+            self.seed(guild, invites)
+            return [(None, True)] * joins
+        unclaimed = self.unclaimed[guild.id]
+        self.invites[guild.id] = {x.code: x for x in invites}
+        new_snapshot = {x.code: x.uses or 0 for x in invites}
+        for code, uses in new_snapshot.items():
+            if uses > snapshot.get(code, 0):
+                unclaimed[code] += uses - snapshot.get(code, 0)
+        for code in [x for x in unclaimed if x not in new_snapshot]:
+            del unclaimed[code]  # deleted or expired, the uses can't be claimed anymore
+        self.snapshots[guild.id] = new_snapshot
+
+        if len(unclaimed) == 1 and sum(unclaimed.values()) >= joins:
+            # all joins of the batch used the same invite, the extra uses are from the
+            # members whose join will be received later
+            code = next(iter(unclaimed))
+            unclaimed[code] -= joins
+            if not unclaimed[code]:
+                del unclaimed[code]
+            return [(code if code in registered else None, False)] * joins
+        # different invites were used by the joins of the batch, or some of their uses aren't
+        # counted yet (vanity URL...), there's no way to know who used what
+        log.debug(
+            f"{joins} joins in guild {guild.name} (ID: {guild.id}) can't be attributed. "
+            "Uses: " + ", ".join(f"{x} (+{y})" for x, y in unclaimed.items())
+        )
+        unclaimed.clear()
+        return [(None, True)] * joins
@@ -66,9 +66,6 @@ class Say(BaseCog):
         log = logging.getLogger("laggron.say")
         # this is called now so the logger is already initialized
 
-    def _set_context(self, data: dict):
-        self.sentry.client.extra_context(data)
-
     async def say(self, ctx, text, files):
 
         if text == "":  # no text, maybe attachment
@@ -278,11 +275,11 @@ class Say(BaseCog):
                                 "Thank you for helping me with the development process!"
                             )
                         )
-                        await self.sentry.enable()
+                        self.sentry.enable()
                     else:
                         # disabled
                         await ctx.send(_("Error logging has been disabled."))
-                        await self.sentry.disable()
+                        self.sentry.disable()
                     log.info(
                         f"Sentry error reporting was {status(not current_status)[1]} "
                         "on this instance."
@@ -329,13 +326,13 @@ class Say(BaseCog):
         }
         if ctx.guild:
             context["guild"] = f"{ctx.guild.name} (ID: {ctx.guild.id})"
-        self._set_context(context)
-        self.sentry.disable_stdout()  # remove console output since red also handle this
+        # the context is attached to this record only, and the console output is skipped
+        # since Red already handles this
         log.error(
-            f"Exception in command '{ctx.command.qualified_name}'.\n\n", exc_info=error.original
+            f"Exception in command '{ctx.command.qualified_name}'.\n\n",
+            exc_info=error.original,
+            extra={"data": context, "no_stdout": True},
         )
-        self.sentry.enable_stdout()  # re-enable console output for warnings
-        self._set_context({})  # remove context for future logs
 
     async def stop_interaction(self, user):
         self.interaction.remove(user)
@@ -350,3 +347,5 @@ class Say(BaseCog):
             self.bot.loop.create_task(self.stop_interaction(user))
         self.clear_cache()
         self.sentry.disable()
+        log.handlers = []
+        self.sentry.stop_file_logging()
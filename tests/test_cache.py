@@ -0,0 +1,145 @@
+"""
+Compare the CachedDriver with the driver it wraps.
+
+Run with ``make test``.
+"""
+
+import asyncio
+import random
+import unittest
+
+from benchmarks.config import MemoryDriver
+from laggron_utils.cache import CachedDriver
+
+KEYS = ("a", "b", "c")
+DEPTH = 3
+
+
+def random_operation(rng: random.Random) -> tuple:
+    """
+    A random get, set or clear. Only the deepest values are not dicts, so a write never goes
+    through a value that isn't a dict, which raises an error.
+    """
+    identifiers = tuple(rng.choice(KEYS) for i in range(rng.randint(1, DEPTH)))
+    action = rng.choice(("get", "set", "set", "clear"))
+    if action != "set":
+        return action, identifiers, None
+    if len(identifiers) == DEPTH:
+        return action, identifiers, rng.randint(0, 9)
+    value = {}
+    partial = value
+    for i in range(len(identifiers), DEPTH - 1):
+        partial = partial.setdefault(rng.choice(KEYS), {})
+    if len(identifiers) < DEPTH:
+        partial[rng.choice(KEYS)] = rng.randint(0, 9)
+    return action, identifiers, value
+
+
+class FailingDriver(MemoryDriver):
+    """
+    A MemoryDriver whose writes raise while ``fail`` is set, before or after writing like a
+    request that times out.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fail = None  # "before" or "after"
+
+    async def set(self, *identifiers, value=None):
+        if self.fail == "before":
+            raise RuntimeError("Write failed")
+        await super().set(*identifiers, value=value)
+        if self.fail == "after":
+            raise RuntimeError("Write failed")
+
+    async def clear(self, *identifiers):
+        if self.fail == "before":
+            raise RuntimeError("Write failed")
+        await super().clear(*identifiers)
+        if self.fail == "after":
+            raise RuntimeError("Write failed")
+
+
+async def run(driver, operation: tuple):
+    action, identifiers, value = operation
+    try:
+        if action == "get":
+            return await driver.get(*identifiers)
+        if action == "set":
+            return await driver.set(*identifiers, value=value)
+        return await driver.clear(*identifiers)
+    except KeyError:
+        return KeyError
+
+
+class CachedDriverTest(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+
+    def tearDown(self):
+        self.loop.close()
+        asyncio.set_event_loop(None)
+
+    def compare(self, seed: int, steps: int = 200, **kwargs):
+        """
+        Apply the same random operations to a MemoryDriver and to a CachedDriver over another
+        one. The reads and the stored data must be the same at each step.
+        """
+        rng = random.Random(seed)
+        plain = MemoryDriver("Test", "1", serialize=False)
+        cached = CachedDriver(MemoryDriver("Test", "1", serialize=False), **kwargs)
+
+        async def compare():
+            for step in range(steps):
+                operation = random_operation(rng)
+                expected = await run(plain, operation)
+                result = await run(cached, operation)
+                message = f"seed {seed}, step {step}: {operation}"
+                self.assertEqual(result, expected, message)
+                if rng.random() < 0.2:
+                    await cached.flush()
+                    self.assertEqual(cached.driver.data, plain.data, message)
+            await cached.close()
+            self.assertEqual(cached.driver.data, plain.data, f"seed {seed}, after closing")
+
+        self.loop.run_until_complete(compare())
+
+    def test_write_through(self):
+        for seed in range(50):
+            self.compare(seed)
+
+    def test_write_behind(self):
+        for seed in range(50):
+            self.compare(seed, write_behind=60)
+
+    def test_small_cache(self):
+        for seed in range(50):
+            self.compare(seed, max_entries=2, write_behind=60)
+
+    def test_failed_write(self):
+        """After a write raises, the cache must return what the driver has."""
+
+        async def check(fail: str, write):
+            driver = FailingDriver("Test", "1", serialize=False)
+            cached = CachedDriver(driver)
+            await cached.set("a", value={"b": {"c": 1}, "d": 2})
+            # everything around the write is cached
+            for identifiers in (("a",), ("a", "b"), ("a", "b", "c"), ("a", "d")):
+                await cached.get(*identifiers)
+            driver.fail = fail
+            with self.assertRaises(RuntimeError):
+                await write(cached)
+            driver.fail = None
+            for identifiers in (("a",), ("a", "b"), ("a", "b", "c"), ("a", "d")):
+                operation = ("get", identifiers, None)
+                expected = await run(driver, operation)
+                self.assertEqual(await run(cached, operation), expected, f"{fail}: {operation}")
+
+        for fail in ("before", "after"):
+            self.loop.run_until_complete(check(fail, lambda x: x.set("a", "b", "c", value=3)))
+            self.loop.run_until_complete(check(fail, lambda x: x.clear("a", "b", "c")))
+
+
+if __name__ == "__main__":
+    unittest.main()
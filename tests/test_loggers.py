@@ -0,0 +1,84 @@
+"""
+Check the log records given to the handlers of a cog.
+
+Run with ``make test``.
+"""
+
+import logging
+import tempfile
+import unittest
+
+from logging.handlers import QueueHandler
+from pathlib import Path
+from unittest import mock
+
+from laggron_utils.loggers import Log
+
+
+def prepare_in_place(self, record):
+    """QueueHandler.prepare before Python 3.7.3, it modifies the record given."""
+    msg = self.format(record)
+    record.message = msg
+    record.msg = msg
+    record.args = None
+    record.exc_info = None
+    record.exc_text = None
+    return record
+
+
+class TestLog(Log):
+    cog_name = "Test"
+    logger_name = "laggron.test"
+    file_name = "test.log"
+
+
+class RecordHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+class LogTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        with mock.patch(
+            "laggron_utils.loggers.cog_data_path", return_value=Path(self.folder.name)
+        ):
+            self.log = TestLog(bot=None, version="1")
+        # added after the file handler, like the stdout and Sentry handlers
+        self.handler = RecordHandler()
+        self.log.log.addHandler(self.handler)
+
+    def tearDown(self):
+        self.log.log.removeHandler(self.handler)
+        self.log.stop_file_logging()
+        self.folder.cleanup()
+
+    def test_traceback_kept(self):
+        self.check_traceback()
+
+    def test_traceback_kept_old_python(self):
+        with mock.patch.object(QueueHandler, "prepare", prepare_in_place):
+            self.check_traceback()
+
+    def check_traceback(self):
+        try:
+            raise ValueError("Test error")
+        except ValueError:
+            self.log.log.error("Something failed with %s.", "arguments", exc_info=True)
+        record = self.handler.records[0]
+        self.assertIsNotNone(record.exc_info)
+        self.assertIs(record.exc_info[0], ValueError)
+        self.assertEqual(record.msg, "Something failed with %s.")
+        self.assertEqual(record.args, ("arguments",))
+        self.log.stop_file_logging()  # writes the file
+        content = (Path(self.folder.name) / "test.log").read_text()
+        self.assertIn("Something failed with arguments.", content)
+        self.assertIn("ValueError: Test error", content)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+"""
+Check the invites attributed to the joins by the InviteTracker of RoleInvite.
+
+Run with ``make test``.
+"""
+
+import asyncio
+import unittest
+
+from benchmarks.fakes import FakeBot, FakeHTTP, make_guild
+from roleinvite.tracker import InviteTracker
+
+
+class InviteTrackerTest(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.bot = FakeBot(FakeHTTP(latency=0), loop=self.loop)
+        self.guild = make_guild(self.bot, members=5, channels=1)
+        self.tracker = InviteTracker(window=0)
+        self.invites = [
+            self.loop.run_until_complete(self.guild.text_channels[0].create_invite())
+            for i in range(3)
+        ]
+        self.tracker.seed(self.guild, self.invites)
+
+    def tearDown(self):
+        self.loop.close()
+        asyncio.set_event_loop(None)
+
+    def join(self, invites: list, registered: list) -> list:
+        """
+        Members join at the same time with the given invites, :py:obj:`None` for the vanity
+        URL. Returns their attributions.
+        """
+        members = []
+        for i, invite in enumerate(invites):
+            if invite is not None:
+                # Discord counts the use before sending the event
+                invite.uses += 1
+            members.append(self.guild.add_member(self.bot.add_user(f"joined-{i}")))
+        codes = [x.code for x in registered]
+        return self.loop.run_until_complete(
+            asyncio.gather(*[self.tracker.attribute(x, codes) for x in members])
+        )
+
+    def test_same_invite(self):
+        invite = self.invites[0]
+        results = self.join([invite] * 3, self.invites)
+        self.assertEqual(results, [(invite.code, False)] * 3)
+
+    def test_unregistered_invite(self):
+        results = self.join([self.invites[0]] * 2, self.invites[1:])
+        self.assertEqual(results, [(None, False)] * 2)
+
+    def test_different_invites(self):
+        results = self.join([self.invites[0], self.invites[1], self.invites[0]], self.invites)
+        self.assertEqual(results, [(None, True)] * 3)
+        # the uses of that batch must not be given to the next joins
+        invite = self.invites[2]
+        self.assertEqual(self.join([invite], self.invites), [(invite.code, False)])
+
+    def test_vanity_url(self):
+        # no use is counted for the member joining with the vanity URL
+        results = self.join([self.invites[0], None], self.invites)
+        self.assertEqual(results, [(None, True)] * 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
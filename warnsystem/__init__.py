@@ -5,6 +5,8 @@ import asyncio
 from redbot.core.data_manager import cog_data_path
 from pathlib import Path
 
+from laggron_utils.cache import wait_closed
+
 from .warnsystem import WarnSystem
 from .loggers import Log
 
@@ -74,6 +76,8 @@ async def ask_enable_sentry(bot):
 async def setup(bot):
     global _
     n = WarnSystem(bot)
+    # the previous instance may still be saving its config after a reload
+    await wait_closed(n.data.driver.cog_name)
     _ = n.translator
     if "Warnings" in bot.cogs:
         raise CogLoadError(
@@ -4,10 +4,15 @@ import logging
 import os
 import sys
 
+from collections import Counter
 from copy import deepcopy
+from redbot.core.data_manager import cog_data_path
 from typing import Union, Optional
 from datetime import datetime, timedelta
 
+from laggron_utils.cache import CachedDriver
+from laggron_utils.utils import write_file
+
 try:
     from redbot.core.modlog import get_modlog_channel as get_red_modlog_channel
 except RuntimeError:
@@ -15,6 +20,11 @@ except RuntimeError:
 
 from .warnsystem import _  # translator
 from . import errors
+from .archive import CaseArchive
+from .capabilities import GuildCapabilities
+from .escalation import WarnWindows
+from .invites import InvitePool
+from .metrics import MetricsRegistry
 
 log = logging.getLogger("laggron.warnsystem")
 if logging.getLogger("red").isEnabledFor(logging.DEBUG):
@@ -23,6 +33,31 @@ if logging.getLogger("red").isEnabledFor(logging.DEBUG):
 else:
     log.setLevel(logging.WARNING)
 
+# minimum number of old cases for archiving them when a member is warned
+ARCHIVE_BATCH_SIZE = 10
+# number of seconds an idempotency key is kept if the guild didn't set a window
+IDEMPOTENCY_KEY_TIME = 60
+# we can't know when Red's modlog channel is modified, its value is kept for a minute only
+RED_MODLOG_CACHE_TIME = timedelta(minutes=1)
+
+METRICS_DESCRIPTIONS = {
+    "warn_seconds": "Total duration of API.warn.",
+    "warn_validation_seconds": "Checks of the arguments and permissions in API.warn.",
+    "warn_embeds_seconds": "Generation of the embeds in API.warn.",
+    "warn_dm_seconds": "Sending the embed to the warned member in API.warn.",
+    "warn_action_seconds": "Mute, kick or ban in API.warn.",
+    "warn_modlog_seconds": "Sending the embed to the modlog channel in API.warn.",
+    "warn_case_seconds": "Writing the case and the timer in API.warn.",
+    "check_endwarn_seconds": "Duration of a pass of the loop ending temporary warns.",
+    "temporary_warns_pending": "Number of temporary warns waiting for their end.",
+    "archived_cases_total": "Number of cases moved to the archive.",
+    "warn_duplicates_total": "Number of duplicated warnings skipped.",
+    "config_reads_total": "Number of reads from Config.",
+    "config_writes_total": "Number of writes to Config.",
+    "config_cache_hits": "Number of reads from Config served by the cache.",
+    "config_cache_misses": "Number of reads from Config not in the cache.",
+}
+
 
 class API:
     """
@@ -48,12 +83,32 @@ class API:
     def __init__(self, bot, config):
         self.bot = bot
         self.data = config
+        self.invites = InvitePool(bot)
+        self.archive = CaseArchive(bot)
+        self.escalations = WarnWindows(self)
+        self.capabilities = {}  # guild ID: GuildCapabilities
+        # guild ID: {level: (channel, expiration date)}, see get_modlog_channel
+        self.modlog_channels = {}
+        self.recent_warns = {}  # deduplication key: (future of the case, expiration date)
+        self.modlog_locks = {}  # guild ID: lock held while writing the modlogs of a member
+        self.invalid_dates = set()  # (guild ID, member ID, date) of the cases already reported
+        self.metrics = MetricsRegistry("warnsystem", METRICS_DESCRIPTIONS)
 
         # importing this here prevents a RuntimeError when building the documentation
         # TODO find another solution
 
     def _get_datetime(self, time: str) -> datetime:
-        return datetime.strptime(time, "%a %d %B %Y %H:%M:%S")
+        try:
+            return datetime.strptime(time, "%a %d %B %Y %H:%M:%S")
+        except ValueError:
+            # the cases edited by the previous versions were saved without the seconds
+            return datetime.strptime(time, "%a %d %B %Y %H:%M")
+
+    def _modlog_lock(self, guild_id: int) -> asyncio.Lock:
+        lock = self.modlog_locks.get(guild_id)
+        if lock is None:
+            lock = self.modlog_locks[guild_id] = asyncio.Lock()
+        return lock
 
     def _format_timedelta(self, time: timedelta):
         """Format a timedelta object into a string"""
@@ -116,6 +171,42 @@ class API:
                 )
         return user
 
+    async def get_capabilities(self, guild: discord.Guild) -> GuildCapabilities:
+        """
+        Get what the bot is able to do on a guild.
+
+        The result is kept until the roles, the channels or the bot's member are updated.
+
+        Parameters
+        ----------
+        guild: discord.Guild
+            The guild to check.
+
+        Returns
+        -------
+        ~warnsystem.capabilities.GuildCapabilities
+            The bot's permissions, top role, the mute role and the hierarchy setting.
+        """
+        capabilities = self.capabilities.get(guild.id)
+        if capabilities is None:
+            guild_data = self.data.guild(guild)
+            capabilities = GuildCapabilities(
+                guild, await guild_data.mute_role(), await guild_data.respect_hierarchy()
+            )
+            self.capabilities[guild.id] = capabilities
+        return capabilities
+
+    def _invalidate_capabilities(
+        self, guild: discord.Guild, channel: Optional[discord.abc.GuildChannel] = None
+    ):
+        """Forget the capabilities of a guild, or only the permissions in one of its channels."""
+        if channel is None:
+            self.capabilities.pop(guild.id, None)
+            return
+        capabilities = self.capabilities.get(guild.id)
+        if capabilities is not None:
+            capabilities.channels.pop(channel.id, None)
+
     async def _mute(self, member: discord.Member, reason: Optional[str] = None):
         """Mute an user on the guild."""
         guild = member.guild
@@ -143,6 +234,7 @@ class API:
         time: datetime,
         reason: Optional[str] = None,
         duration: Optional[timedelta] = None,
+        escalation: bool = False,
     ) -> dict:
         """Create a new case for a member. Don't call this, call warn instead."""
         data = {
@@ -157,10 +249,120 @@ class API:
             if not duration
             else (datetime.today() + duration).strftime("%a %d %B %Y %H:%M:%S"),
         }
-        async with self.data.custom("MODLOGS", guild.id, user.id).x() as logs:
-            logs.append(data)
+        if escalation:
+            # the warnings counted for this escalation are not counted again, see WarnWindows
+            data["escalation"] = True
+        archive_after = await self.data.guild(guild).archive_after()
+        async with self._modlog_lock(guild.id):
+            async with self.data.custom("MODLOGS", guild.id, user.id).all() as member_data:
+                member_data["x"].append(data)
+                if archive_after is not None:
+                    # archiving in batches prevents creating a new file on each warn
+                    await self._archive_member_cases(
+                        guild.id, user.id, member_data, archive_after, minimum=ARCHIVE_BATCH_SIZE
+                    )
         return data
 
+    async def _archive_member_cases(
+        self, guild_id: int, member_id: int, member_data: dict, days: int, minimum: int = 1
+    ) -> int:
+        """
+        Move the cases of a member older than the given number of days to the archive.
+
+        ``member_data`` is the member's modlog, it is modified but not saved.
+        Returns the number of archived cases.
+        """
+        logs = member_data["x"]
+        limit = datetime.today() - timedelta(days=days)
+        total = 0
+        for i, case in enumerate(logs):  # cases are sorted from the oldest to the newest
+            try:
+                time = self._get_datetime(case["time"])
+            except (TypeError, ValueError):
+                # unknown date, the case follows the ones around it
+                key = (guild_id, member_id, case["time"])
+                if key in self.invalid_dates:
+                    continue
+                self.invalid_dates.add(key)
+                log.warning(
+                    f"Case {self._count_archived(member_data) + i + 1} of member {member_id} "
+                    f"in guild {guild_id} has an invalid date: {case['time']!r}"
+                )
+                continue
+            if time >= limit:
+                break
+            total = i + 1
+        if not total or total < minimum:
+            return 0
+        segments = member_data.setdefault("archive", [])
+        start = sum(x["count"] for x in segments)
+        cases = logs[:total]
+        await self.archive.write(guild_id, member_id, start, cases)
+        segments.append(
+            {
+                "start": start,
+                "count": total,
+                "levels": dict(Counter(str(x["level"]) for x in cases)),
+            }
+        )
+        del logs[:total]
+        self.metrics.inc("archived_cases_total", total)
+        return total
+
+    async def archive_cases(
+        self, guild: discord.Guild, user: Optional[Union[discord.User, discord.Member]] = None
+    ) -> int:
+        """
+        Move the old cases to the archive now, following the guild's policy.
+
+        This is done automatically when a member is warned, call this for applying the policy
+        to all members right after it was set.
+
+        Parameters
+        ----------
+        guild: discord.Guild
+            The guild where the cases should be archived.
+        user: Optional[Union[discord.User, discord.Member]]
+            The user whose cases should be archived. If this argument is omitted, the cases of
+            all members of the guild are archived.
+
+        Returns
+        -------
+        int
+            The number of cases moved to the archive.
+
+        Raises
+        ------
+        ~warnsystem.errors.BadArgument
+            Archiving is disabled on this guild.
+        """
+        days = await self.data.guild(guild).archive_after()
+        if days is None:
+            raise errors.BadArgument("Archiving is disabled on this guild.")
+        if user:
+            async with self._modlog_lock(guild.id):
+                async with self.data.custom("MODLOGS", guild.id, user.id).all() as member_data:
+                    return await self._archive_member_cases(guild.id, user.id, member_data, days)
+        total = 0
+        logs = await self.data.custom("MODLOGS", guild.id).all()
+        for member, content in logs.items():
+            if member in ("x", "archive") or not content.get("x"):  # no case to archive
+                continue
+            async with self._modlog_lock(guild.id):
+                # read again, the member may have been warned since the guild was read
+                member_data = await self.data.custom("MODLOGS", guild.id, int(member)).all()
+                archived = await self._archive_member_cases(
+                    guild.id, int(member), member_data, days
+                )
+                if archived:
+                    # only the members with archived cases are saved again
+                    await self.data.custom("MODLOGS", guild.id, int(member)).set(member_data)
+                    total += archived
+        return total
+
+    def _count_archived(self, member_data: dict) -> int:
+        return sum(x["count"] for x in member_data.get("archive", []))
+
     async def get_case(
         self, guild: discord.Guild, user: Union[discord.User, discord.Member], index: int
     ) -> dict:
@@ -196,8 +398,15 @@ class API:
         ~warnsystem.errors.NotFound
             The case requested doesn't exist.
         """
+        member_data = await self.data.custom("MODLOGS", guild.id, user.id).all()
+        archived = self._count_archived(member_data)
         try:
-            case = (await self.data.custom("MODLOGS", guild.id, user.id).x())[index - 1]
+            if index < 1:
+                raise IndexError
+            if index <= archived:
+                case = await self.archive.get(guild.id, user.id, member_data["archive"], index - 1)
+            else:
+                case = member_data["x"][index - archived - 1]
         except IndexError:
             raise errors.NotFound("The case requested doesn't exist.")
         else:
@@ -207,7 +416,10 @@ class API:
             return case
 
     async def get_all_cases(
-        self, guild: discord.Guild, user: Optional[Union[discord.User, discord.Member]] = None
+        self,
+        guild: discord.Guild,
+        user: Optional[Union[discord.User, discord.Member]] = None,
+        archived: bool = True,
     ) -> list:
         """
         Get all cases for a member of a guild.
@@ -219,6 +431,9 @@ class API:
         user: Optional[Union[discord.User, discord.Member]]
             The user you want to get the cases from. If this arguments is omitted, all cases of
             the guild are returned.
+        archived: bool
+            If the archived cases should be included. Defaults to :py:obj:`True`, set this to
+            :py:obj:`False` if you only need the recent cases, reading the archive is slower.
 
         Returns
         -------
@@ -259,13 +474,22 @@ class API:
                 }
         """
         if user:
-            return await self.data.custom("MODLOGS", guild.id, user.id).x()
+            member_data = await self.data.custom("MODLOGS", guild.id, user.id).all()
+            if not archived or not member_data["archive"]:
+                return member_data["x"]
+            cases = await self.archive.read_all(guild.id, user.id, member_data["archive"])
+            return cases + member_data["x"]
         logs = await self.data.custom("MODLOGS", guild.id).all()
         all_cases = []
         for member, content in logs.items():
-            if member == "x":
+            if member in ("x", "archive"):  # default values of the members
                 continue
-            for log in content["x"]:
+            cases = content["x"]
+            if archived and content.get("archive"):
+                cases = (
+                    await self.archive.read_all(guild.id, int(member), content["archive"]) + cases
+                )
+            for log in cases:
                 author = guild.get_member(log["author"])
                 time = log["time"]
                 if time:
@@ -306,16 +530,24 @@ class API:
         ~warnsystem.errors.BadArgument
             The reason is above 1024 characters. Due to Discord embed rules, you have to make it
             shorter.
+
+            This is also raised if the case is archived, archived cases cannot be edited.
         ~warnsystem.errors.NotFound
             The case requested doesn't exist.
         """
         if len(new_reason) > 1024:
             raise errors.BadArgument("The reason must not be above 1024 characters.")
-        case = await self.get_case(guild, user, index)
-        case["reason"] = new_reason
-        case["time"] = case["time"].strftime("%a %d %B %Y %H:%M")
-        async with self.data.custom("MODLOGS", guild.id, user.id).x() as logs:
-            logs[index - 1] = case
+        async with self._modlog_lock(guild.id):
+            async with self.data.custom("MODLOGS", guild.id, user.id).all() as member_data:
+                archived = self._count_archived(member_data)
+                if 0 < index <= archived:
+                    raise errors.BadArgument("Archived cases cannot be edited.")
+                try:
+                    if index < 1:
+                        raise IndexError
+                    member_data["x"][index - archived - 1]["reason"] = new_reason
+                except IndexError:
+                    raise errors.NotFound("The case requested doesn't exist.")
         return True
 
     async def get_modlog_channel(
@@ -371,6 +603,9 @@ class API:
 
             .. note:: It can be :py:obj:`None` if the channel doesn't exist anymore.
 
+            .. note:: The channel of each level is kept in memory until it is modified with
+                ``[p]warnset channel`` or a channel is deleted.
+
         Raises
         ------
         ~warnsystem.errors.NotFound
@@ -386,20 +621,49 @@ class API:
 
         if level == "all":
             return await self.data.guild(guild).channels.all()
-        default_channel = await self.data.guild(guild).channels.main()
-        if level:
-            channel = await self.data.guild(guild).channels.get_raw(str(level))
-        else:
-            return default_channel
-
-        if not default_channel and not channel:
-            # warnsystem default channel doesn't exist, let's try to get Red's one
-            try:
-                return await get_red_modlog_channel(guild)
-            except RuntimeError:
-                raise errors.NotFound("No modlog found from WarnSystem or Red")
+        if not level:
+            return await self.data.guild(guild).channels.main()
+
+        cached = self.modlog_channels.get(guild.id, {}).get(level)
+        if cached is None or (cached[1] is not None and cached[1] < datetime.now()):
+            cached = await self._find_modlog_channel(guild, level)
+            if cached[0] is not None:
+                # resolved again on the next call, the library may not know the channel yet
+                self.modlog_channels.setdefault(guild.id, {})[level] = cached
+        channel = cached[0]
+        if channel is False:
+            raise errors.NotFound("No modlog found from WarnSystem or Red")
+        return channel
+
+    async def _find_modlog_channel(self, guild: discord.Guild, level: int) -> tuple:
+        """
+        Resolve the modlog channel of a level for the cache of get_modlog_channel.
 
-        return self.bot.get_channel(channel if channel else default_channel)
+        Returns the channel (:py:obj:`None` if it was deleted, :py:obj:`False` if there is no
+        channel set) and the date when it must be resolved again, or :py:obj:`None`. The
+        :py:obj:`None` results are not cached.
+        """
+        channels = await self.data.guild(guild).channels.all()
+        channel = channels[str(level)] or channels["main"]
+        if channel:
+            return self.bot.get_channel(channel), None
+        # warnsystem default channel doesn't exist, let's try to get Red's one
+        expiration = datetime.now() + RED_MODLOG_CACHE_TIME
+        try:
+            return await get_red_modlog_channel(guild), expiration
+        except RuntimeError:
+            return False, expiration
+
+    def _invalidate_modlog_channels(self, guild: discord.Guild):
+        """Forget the modlog channels of a guild."""
+        self.modlog_channels.pop(guild.id, None)
+
+    def _set_message_not_sent(self, embed: discord.Embed):
+        """Add a notice to the modlog embed when the member couldn't receive the DM."""
+        embed.description += _(
+            "\n\n***The message couldn't be delivered to the member. We may don't "
+            "have a server in common or he blocked me/messages from this guild.***"
+        )
 
     async def get_embeds(
         self,
@@ -452,12 +716,17 @@ class API:
         if not reason:
             reason = _("No reason was provided.")
             mod_message = _("\nEdit this with `[p]warnings @{name}`").format(name=str(member))
-        logs = await self.data.custom("MODLOGS", guild.id, member.id).x()
+        member_data = await self.data.custom("MODLOGS", guild.id, member.id).all()
+        logs = member_data["x"]
+        # the index of the archive keeps the count of each level
+        archived = member_data["archive"]
 
         # prepare the status field
-        total_warns = len(logs) + 1
+        total_warns = len(logs) + self._count_archived(member_data) + 1
         total_type_warns = (
-            len([x for x in logs if x["level"] == level]) + 1
+            len([x for x in logs if x["level"] == level])
+            + sum(x["levels"].get(str(level), 0) for x in archived)
+            + 1
         )  # number of warns of the received type
 
         # a lambda that returns a string; if True is given, a third person sentence is returned
@@ -476,17 +745,10 @@ class API:
         # we set any value that can be used multiple times
         invite = None
         log_description = await self.data.guild(guild).embed_description_modlog.get_raw(level)
-        if "{invite}" in log_description:
-            try:
-                invite = await guild.create_invite(max_uses=1)
-            except Exception:
-                invite = _("*[couldn't create an invite]*")
         user_description = await self.data.guild(guild).embed_description_user.get_raw(level)
-        if "{invite}" in user_description and not invite:
-            try:
-                invite = await guild.create_invite(max_uses=1)
-            except Exception:
-                invite = _("*[couldn't create an invite]*")
+        if "{invite}" in log_description or "{invite}" in user_description:
+            # invites are created in advance by the pool, we never wait for Discord here
+            invite = self.invites.get(guild) or _("*[couldn't create an invite]*")
         today = datetime.today().strftime("%a %d %B %Y %H:%M")
         if time:
             duration = self._format_timedelta(time)
@@ -514,10 +776,7 @@ class API:
         log_embed.color = await self.data.guild(guild).colors.get_raw(level)
         log_embed.url = await self.data.guild(guild).url()
         if not message_sent:
-            log_embed.description += _(
-                "\n\n***The message couldn't be delivered to the member. We may don't "
-                "have a server in common or he blocked me/messages from this guild.***"
-            )
+            self._set_message_not_sent(log_embed)
 
         # embed for the member in DM
         user_embed = deepcopy(log_embed)
@@ -633,6 +892,7 @@ class API:
                     exc_info=e,
                 )
         await self.data.guild(guild).mute_role.set(role.id)
+        self._invalidate_capabilities(guild)
         return errors
 
     async def format_reason(self, guild: discord.Guild, reason: str = None) -> str:
@@ -669,6 +929,7 @@ class API:
         log_modlog: bool = True,
         log_dm: bool = True,
         take_action: bool = True,
+        idempotency_key: Optional[str] = None,
     ) -> bool:
         """
         Set a warning on a member of a Discord guild and log it with the WarnSystem system.
@@ -710,11 +971,23 @@ class API:
             Specify if the bot should take action on the member (mute, kick, softban, ban). If set
             to :py:obj:`False`, the bot will only send a log embed to the member and in the modlog.
             Default to :py:obj:`True`.
+        idempotency_key: Optional[str]
+            A key identifying the action, such as the ID of the message that triggered it. If
+            another warning with the same key was requested on the guild recently, no action is
+            taken again and the result of the first warning is returned.
+
+            Without a key, warnings with the same member, level and reason are deduplicated if
+            the guild set a window with ``[p]warnset dedup``.
 
         Returns
         -------
         bool
-            :py:obj:`True` if the action was successful.
+            :py:obj:`True` if the action succeeded. The case created for a warning with an
+            idempotency key can be retrieved with :func:`get_recent_warn`.
+
+            If the warning triggers one of the guild's escalation rules, the bot warns the
+            member again with the level of the rule before returning. Errors of that second
+            warning are logged instead of being raised.
 
         Raises
         ------
@@ -747,108 +1020,196 @@ class API:
             Unknown error from Discord API. It's recommanded to catch this
             potential error too.
         """
+        args = (guild, member, author, level, reason, time, log_modlog, log_dm, take_action)
+        window = await self.data.guild(guild).dedup_window()
+        if idempotency_key is not None:
+            key = (guild.id, idempotency_key)
+            window = window or IDEMPOTENCY_KEY_TIME
+        elif window:
+            key = (guild.id, getattr(member, "id", member), level, reason)
+        else:
+            await self._warn(*args)
+            return True
+        while True:
+            now = datetime.now()
+            recent = self.recent_warns.get(key)
+            if recent is None or recent[1] <= now:
+                break
+            # same warning in progress or done, we wait for its result
+            try:
+                await asyncio.shield(recent[0])
+            except asyncio.CancelledError:
+                if not recent[0].cancelled():
+                    raise  # this warning was cancelled
+                continue  # the first warning was cancelled, its key is released
+            self.metrics.inc("warn_duplicates_total")
+            return True
+        future = self.bot.loop.create_future()
+        self.recent_warns[key] = (future, now + timedelta(seconds=window))
+        try:
+            case = await self._warn(*args)
+        except BaseException as e:
+            # the duplicates must not wait forever, even if this warning is cancelled
+            if self.recent_warns.get(key, (None,))[0] is future:
+                del self.recent_warns[key]
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(e)
+                future.exception()  # prevents asyncio from logging it if there's no duplicate
+            raise
+        future.set_result(case)
+        return True
+
+    def get_recent_warn(self, guild: discord.Guild, idempotency_key: str) -> Optional[dict]:
+        """
+        Get the case created by a recent warning with an idempotency key.
+
+        Parameters
+        ----------
+        guild: discord.Guild
+            The guild of the warning.
+        idempotency_key: str
+            The key given to :func:`warn`.
+
+        Returns
+        -------
+        Optional[dict]
+            The case created, see :func:`get_case`, or :py:obj:`None` if the warning is still
+            in progress, failed, or expired. It is shared with the duplicates of the warning,
+            so don't modify it.
+        """
+        recent = self.recent_warns.get((guild.id, idempotency_key))
+        if recent is None or recent[1] <= datetime.now():
+            return None
+        future = recent[0]
+        if not future.done() or future.cancelled() or future.exception():
+            return None
+        return future.result()
+
+    async def _warn(
+        self,
+        guild: discord.Guild,
+        member: Union[discord.Member, int],
+        author: Union[discord.Member, str],
+        level: int,
+        reason: Optional[str],
+        time: Optional[timedelta],
+        log_modlog: bool,
+        log_dm: bool,
+        take_action: bool,
+        escalation: bool = False,
+    ) -> dict:
+        """Warn a member without deduplication, see warn."""
+        watch = self.metrics.stopwatch("warn")
         if not isinstance(level, int) or not 1 <= level <= 5:
             raise errors.InvalidLevel("The level must be between 1 and 5.")
-        if isinstance(member, int):
-            if level != 5:
-                raise errors.BadArgument(
-                    "You need to provide a valid discord.Member object for this action."
-                )
-            member = await self._get_user_info(member)
-            if not member:
-                raise errors.NotFound(_("The requested member does not exist."))
+        if isinstance(member, int) and level != 5:
+            raise errors.BadArgument(
+                "You need to provide a valid discord.Member object for this action."
+            )
 
         # we get the modlog channel now to make sure it exists before doing anything
         mod_channel = await self.get_modlog_channel(guild, level)
+        if mod_channel is None:
+            raise errors.NotFound(
+                _(
+                    "The modlog channel was deleted. Please set a new one with "
+                    "`[p]warnset channel`."
+                )
+            )
+        capabilities = await self.get_capabilities(guild)
 
         # check that the mute role exists
-        mute_role = guild.get_role(await self.data.guild(guild).mute_role())
+        mute_role = capabilities.mute_role
         if not mute_role and level == 2:
             raise errors.MissingMuteRole("You need to create the mute role before doing this.")
 
         # we check for all permission problem that can occur before calling the API
-        if not all(
-            [  # checks if the bot has send_messages and embed_links permissions in modlog channel
-                getattr(mod_channel.permissions_for(guild.me), x)
-                for x in ["send_messages", "embed_links"]
-            ]
-        ):
+        channel_permissions = capabilities.permissions_in(mod_channel)
+        if not (channel_permissions.send_messages and channel_permissions.embed_links):
             raise errors.LostPermissions(
                 _(
                     "I need the `Send messages` and `Embed links` "
                     "permissions in {channel} to do this."
                 ).format(channel=mod_channel.mention)
             )
-        if (
-            level > 1
-            and isinstance(member, discord.Member)
-            and guild.me.top_role.position <= member.top_role.position
-        ):
-            # check if the member is below the bot in the roles's hierarchy
-            raise errors.MemberTooHigh(
-                _(
-                    "Cannot take actions on this member, he is above me in the roles hierarchy. "
-                    "Modify the hierarchy so my top role ({bot_role}) is above {member_role}."
-                ).format(bot_role=guild.me.top_role.name, member_role=member.top_role.name)
-            )
-        if (
-            isinstance(member, discord.Member)
-            and await self.data.guild(guild).respect_hierarchy()
-            and (
-                member.top_role >= author.top_role
-                and not (self.bot.is_owner(author) or author.owner)
-            )
-        ):
-            raise errors.NotAllowedByHierarchy(
-                "The moderator is lower than the member in the servers's role hierarchy."
-            )
-        if level > 2 and isinstance(member, discord.Member) and member == guild.owner:
-            raise errors.MissingPermissions(_("I can't take actions on the owner of the guild."))
         if level == 2:
             # mute with role
-            if not guild.me.guild_permissions.manage_roles:
+            if not capabilities.permissions.manage_roles:
                 raise errors.MissingPermissions(
                     _("I can't manage roles, please give me this permission to continue.")
                 )
-            if mute_role.position >= guild.me.top_role.position:
+            if capabilities.mute_role_position >= capabilities.top_role_position:
                 raise errors.LostPermissions(
                     _(
                         "The mute role `{mute_role}` was moved above my top role `{my_role}`. "
                         "Please move the roles so my top role is above the mute role."
-                    ).format(mute_role=mute_role.name, my_role=guild.me.top_role.name)
+                    ).format(mute_role=mute_role.name, my_role=capabilities.top_role_name)
                 )
         if level == 3:
             # kick
-            if not guild.me.guild_permissions.kick_members:
+            if not capabilities.permissions.kick_members:
                 raise errors.MissingPermissions(
                     _("I can't kick members, please give me this permission to continue.")
                 )
         if level == 4 or level == 5:
             # softban or ban
-            if not guild.me.guild_permissions.ban_members:
+            if not capabilities.permissions.ban_members:
                 raise errors.MissingPermissions(
                     _("I can't ban members, please give me this permission to continue.")
                 )
 
+        if isinstance(member, int):
+            member = await self._get_user_info(member)
+            if not member:
+                raise errors.NotFound(_("The requested member does not exist."))
+        if isinstance(member, discord.Member):
+            if level > 1 and capabilities.top_role_position <= member.top_role.position:
+                # check if the member is below the bot in the roles's hierarchy
+                raise errors.MemberTooHigh(
+                    _(
+                        "Cannot take actions on this member, he is above me in the roles "
+                        "hierarchy. Modify the hierarchy so my top role ({bot_role}) is above "
+                        "{member_role}."
+                    ).format(bot_role=capabilities.top_role_name, member_role=member.top_role.name)
+                )
+            if (
+                capabilities.respect_hierarchy
+                and isinstance(author, discord.Member)
+                and member.top_role >= author.top_role
+                and author != guild.owner
+                and not await self.bot.is_owner(author)
+            ):
+                raise errors.NotAllowedByHierarchy(
+                    "The moderator is lower than the member in the servers's role hierarchy."
+                )
+            if level > 2 and member == guild.owner:
+                raise errors.MissingPermissions(
+                    _("I can't take actions on the owner of the guild.")
+                )
+
+        watch.lap("validation")
+
         # send the message to the user
         if log_modlog or log_dm:
             modlog_e, user_e = await self.get_embeds(guild, member, author, level, reason, time)
+            watch.lap("embeds")
         if log_dm:
+            # the modlog embed is edited instead of being built again, this would consume
+            # another invite from the pool
             try:
                 await member.send(embed=user_e)
             except discord.errors.Forbidden:
-                modlog_e, user_e = await self.get_embeds(
-                    guild, member, author, level, reason, time, message_sent=False
-                )
+                self._set_message_not_sent(modlog_e)
             except discord.errors.HTTPException as e:
-                modlog_e, user_e = await self.get_embeds(
-                    guild, member, author, level, reason, time, message_sent=False
-                )
+                self._set_message_not_sent(modlog_e)
                 log.warn(
                     f"Couldn't send a message to {member} (ID: {member.id}) "
                     "because of an HTTPException.",
                     exc_info=e,
                 )
+            watch.lap("dm")
 
         # take actions
         if take_action:
@@ -893,19 +1254,64 @@ class API:
                     reason=audit_reason,
                     delete_message_days=await self.data.guild(guild).bandays.ban(),
                 )
+            watch.lap("action")
 
         # actions were taken, time to log
         if log_modlog:
             await mod_channel.send(embed=modlog_e)
-        data = await self._create_case(guild, member, author, level, datetime.now(), reason, time)
+            watch.lap("modlog")
+        now = datetime.now()
+        data = await self._create_case(
+            guild, member, author, level, now, reason, time, escalation=escalation
+        )
 
         # start timer if there is a temporary warning
         if time and (level == 2 or level == 5):
             data["member"] = member.id
             await self._start_timer(guild, data)
+        watch.lap("case")
 
         # all good!
-        return True
+        watch.stop()
+        if isinstance(member, discord.Member):
+            await self._escalate(guild, member, level, now)
+        return data
+
+    async def _escalate(self, guild: discord.Guild, member: discord.Member, level: int, time):
+        """Evaluate the escalation rules of the guild after a warning and apply them."""
+        rules = await self.data.guild(guild).escalations()
+        if not rules:
+            return
+        rule = await self.escalations.add(guild, member, level, time, rules)
+        if rule is None:
+            return
+        reason = _("Automatic escalation: {count} level {level} warnings in {period}.").format(
+            count=rule["count"],
+            level=level,
+            period=self._format_timedelta(timedelta(seconds=rule["period"])),
+        )
+        duration = timedelta(seconds=rule["duration"]) if rule["duration"] else None
+        try:
+            # not deduplicated, the window of the rule is already emptied
+            await self._warn(
+                guild,
+                member,
+                guild.me,
+                rule["action_level"],
+                reason,
+                duration,
+                log_modlog=True,
+                log_dm=True,
+                take_action=True,
+                escalation=True,
+            )
+        except Exception as e:
+            # the original warning succeeded, we don't want to raise this to its author
+            log.error(
+                f"Couldn't apply an escalation rule on member {member} (ID: {member.id}) "
+                f"from guild {guild.name} (ID: {guild.id}).",
+                exc_info=e,
+            )
 
     async def _check_endwarn(self):
         async def reinvite(guild, user, reason, duration):
@@ -955,6 +1361,7 @@ class API:
 
         guilds = await self.data.all_guilds()
         now = datetime.today()
+        pending = 0
 
         for guild, data in guilds.items():
             guild = self.bot.get_guild(guild)
@@ -1021,6 +1428,43 @@ class API:
                 data.remove(item)
             if to_remove:
                 await self.data.guild(guild).temporary_warns.set(data)
+            pending += len(data)
+        self.metrics.gauge("temporary_warns_pending").set(pending)
+
+    def _prune_recent_warns(self):
+        """Forget the deduplication keys that expired."""
+        now = datetime.now()
+        for key in [x for x, y in self.recent_warns.items() if y[1] <= now]:
+            del self.recent_warns[key]
+
+    def _update_cache_metrics(self):
+        driver = self.data.driver
+        if isinstance(driver, CachedDriver):
+            self.metrics.gauge("config_cache_hits").set(driver.hits)
+            self.metrics.gauge("config_cache_misses").set(driver.misses)
+
+    async def _export_metrics(self):
+        """Write the metrics to a Prometheus text file if the owner enabled it."""
+        if not await self.data.export_metrics():
+            return
+        self._update_cache_metrics()
+        path = cog_data_path(raw_name="WarnSystem") / "metrics.prom"
+        text = self.metrics.to_prometheus()
+        # writing is done in another thread to not block the bot
+        await self.bot.loop.run_in_executor(None, write_file, path, text)
+
+    async def _fill_invite_pools(self):
+        """Prepare invites for the guilds using the ``{invite}`` key in their descriptions."""
+        guilds = await self.data.all_guilds()
+        for guild_id, data in guilds.items():
+            guild = self.bot.get_guild(guild_id)
+            if not guild:
+                continue
+            descriptions = list(data["embed_description_modlog"].values()) + list(
+                data["embed_description_user"].values()
+            )
+            if any("{invite}" in x for x in descriptions):
+                self.invites.refill(guild)
 
     async def _loop_task(self):
         """
@@ -1034,10 +1478,17 @@ class API:
             "Starting infinite loop for unmutes and unbans. Canel the "
             'task with bot.get_cog("WarnSystem").task.cancel()'
         )
+        try:
+            await self._fill_invite_pools()
+        except Exception as e:
+            log.error("Couldn't prepare the invite pools.", exc_info=e)
         errors = 0
         while True:
+            self.invites.prune()
+            self._prune_recent_warns()
             try:
-                await self._check_endwarn()
+                with self.metrics.timer("check_endwarn_seconds"):
+                    await self._check_endwarn()
             except Exception as e:
                 errors += 1
                 if errors >= 3:
@@ -1053,4 +1504,8 @@ class API:
                 log.error(
                     "Error in loop for unmutes and unbans. The loop will be resumed.", exc_info=e
                 )
+            try:
+                await self._export_metrics()
+            except Exception as e:
+                log.error("Couldn't export the metrics.", exc_info=e)
             await asyncio.sleep(10)
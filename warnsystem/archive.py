@@ -0,0 +1,128 @@
+import gzip
+import json
+import logging
+import shutil
+
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+from redbot.core.data_manager import cog_data_path
+
+from laggron_utils.utils import write_file
+
+log = logging.getLogger("laggron.warnsystem")
+
+
+class CaseArchive:
+    """
+    Cold storage for the old cases of the members, out of Config.
+
+    Each archival writes a new segment, a compressed JSON list of cases, at
+    ``archive/<guild ID>/<member ID>/<index of the first case>.json.gz`` in the cog's data
+    folder. Segments are never modified after they're written.
+
+    The index of the segments is kept in Config, in the ``archive`` key of the member's
+    modlog, with the number of cases and their levels. A segment is only referenced once it
+    is fully written, so an interrupted archival leaves the cases in the live list.
+
+    Parameters
+    ----------
+    bot: redbot.core.bot.Red
+        The bot, used for running the file operations in an executor.
+    path: Optional[pathlib.Path]
+        Where the segments are stored. Defaults to the ``archive`` folder of the cog.
+    cache_size: int
+        The number of decoded segments kept in memory.
+    """
+
+    def __init__(self, bot, path: Optional[Path] = None, cache_size: int = 32):
+        self.bot = bot
+        self._path = path
+        self.cache_size = cache_size
+        self.cache = OrderedDict()  # segment path: list of cases
+
+    @property
+    def path(self) -> Path:
+        # resolved lazily, the data manager isn't always loaded when the API is created
+        if self._path is None:
+            self._path = cog_data_path(raw_name="WarnSystem") / "archive"
+        return self._path
+
+    def _segment_path(self, guild_id: int, member_id: int, start: int) -> Path:
+        return self.path / str(guild_id) / str(member_id) / f"{start}.json.gz"
+
+    def _write(self, path: Path, cases: list):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        write_file(path, gzip.compress(json.dumps(cases).encode("utf-8")))
+
+    def _read(self, path: Path) -> list:
+        with gzip.open(str(path), "rt", encoding="utf-8") as file:
+            return json.load(file)
+
+    async def write(self, guild_id: int, member_id: int, start: int, cases: list):
+        """
+        Write a new segment of cases.
+
+        A segment left by an interrupted archival at the same place is replaced.
+        """
+        path = self._segment_path(guild_id, member_id, start)
+        await self.bot.loop.run_in_executor(None, self._write, path, cases)
+        self.cache.pop(path, None)
+
+    async def read(self, guild_id: int, member_id: int, segment: dict) -> list:
+        """
+        Read the cases of a segment from its index entry.
+
+        The returned list is shared with the cache, don't modify its cases.
+        """
+        path = self._segment_path(guild_id, member_id, segment["start"])
+        cases = self.cache.get(path)
+        if cases is not None:
+            self.cache.move_to_end(path)
+            return cases
+        try:
+            cases = await self.bot.loop.run_in_executor(None, self._read, path)
+        except (OSError, ValueError) as e:
+            log.error(
+                f"Couldn't read the archived cases {segment['start'] + 1} to "
+                f"{segment['start'] + segment['count']} of member {member_id} on guild "
+                f"{guild_id}.",
+                exc_info=e,
+            )
+            return []
+        # only the part referenced by the index is valid
+        cases = cases[: segment["count"]]
+        self.cache[path] = cases
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return cases
+
+    async def read_all(self, guild_id: int, member_id: int, segments: list) -> list:
+        """Get a copy of all the archived cases of a member, from the oldest to the newest."""
+        cases = []
+        for segment in segments:
+            cases.extend(dict(x) for x in await self.read(guild_id, member_id, segment))
+        return cases
+
+    async def get(self, guild_id: int, member_id: int, segments: list, index: int) -> dict:
+        """
+        Get a copy of an archived case from its position (starting at 0).
+
+        Raises
+        ------
+        IndexError
+            The case is not in the archive.
+        """
+        for segment in segments:
+            if segment["start"] <= index < segment["start"] + segment["count"]:
+                cases = await self.read(guild_id, member_id, segment)
+                return dict(cases[index - segment["start"]])
+        raise IndexError("The case is not archived.")
+
+    async def clear(self):
+        """Delete all the archived cases."""
+        self.cache.clear()
+        await self.bot.loop.run_in_executor(
+            None, lambda: shutil.rmtree(str(self.path), ignore_errors=True)
+        )
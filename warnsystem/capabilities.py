@@ -0,0 +1,40 @@
+import discord
+
+from typing import Optional
+
+
+class GuildCapabilities:
+    """
+    A snapshot of what the bot is able to do on a guild.
+
+    This is built once and reused by :func:`~warnsystem.api.API.warn` for checking the
+    permissions before doing anything, the cog drops it when the roles, the channels or the
+    bot's member are updated.
+
+    Parameters
+    ----------
+    guild: discord.Guild
+        The guild of the snapshot.
+    mute_role_id: Optional[int]
+        The ID of the mute role set for the guild.
+    respect_hierarchy: bool
+        If the guild enabled the hierarchy check for moderators.
+    """
+
+    def __init__(self, guild: discord.Guild, mute_role_id: Optional[int], respect_hierarchy: bool):
+        self.member = guild.me
+        self.permissions = guild.me.guild_permissions
+        self.top_role_name = guild.me.top_role.name
+        self.top_role_position = guild.me.top_role.position
+        self.mute_role = guild.get_role(mute_role_id) if mute_role_id else None
+        self.mute_role_position = self.mute_role.position if self.mute_role else None
+        self.respect_hierarchy = respect_hierarchy
+        self.channels = {}  # channel ID: permissions of the bot, filled when needed
+
+    def permissions_in(self, channel: discord.abc.GuildChannel) -> discord.Permissions:
+        """Get the permissions of the bot in a channel."""
+        permissions = self.channels.get(channel.id)
+        if permissions is None:
+            permissions = channel.permissions_for(self.member)
+            self.channels[channel.id] = permissions
+        return permissions
@@ -0,0 +1,143 @@
+import asyncio
+import discord
+
+from collections import Counter, OrderedDict, deque
+from datetime import datetime, timedelta
+from typing import Optional
+
+TIME_FORMAT = "%a %d %B %Y %H:%M:%S"
+RECENT = timedelta(minutes=1)
+
+
+class WarnWindows:
+    """
+    The recent warning dates of the members, for evaluating the escalation rules.
+
+    Each member has a ring buffer of dates for each level, sized for the rule of that level
+    asking for the most warnings. A member's buffers are filled from their live cases on the
+    first warning since the cog was loaded, then only updated in memory. The warnings of a
+    member received while their buffers are loading wait for that load.
+
+    Parameters
+    ----------
+    api: warnsystem.api.API
+        The API, used for reading the cases.
+    max_members: int
+        The number of members kept in memory, the least recently warned are forgotten.
+    """
+
+    def __init__(self, api, max_members: int = 10000):
+        self.api = api
+        self.max_members = max_members
+        self.windows = OrderedDict()  # (guild ID, member ID): {level: deque of datetimes}
+        self.loading = {}  # (guild ID, member ID): future done when the buffers are loaded
+        # (guild ID, member ID): Counter of the (level, time) of the recent cases loaded, the
+        # warnings waiting for the load must not be counted twice
+        self.loaded = {}
+
+    def _sizes(self, rules: list) -> dict:
+        sizes = {}
+        for rule in rules:
+            sizes[rule["level"]] = max(sizes.get(rule["level"], 0), rule["count"])
+        return sizes
+
+    async def _load(
+        self, guild: discord.Guild, member: discord.Member, rules: list, time: datetime
+    ) -> tuple:
+        """
+        Fill the buffers of a member from their cases.
+
+        Returns the buffers and a :py:class:`~collections.Counter` of the ``(level, time)`` of
+        the cases created around the given time, the warnings that may be running concurrently.
+        """
+        windows = {level: deque(maxlen=size) for level, size in self._sizes(rules).items()}
+        recent = Counter()
+        # the archive is only read if the cases can be archived before the end of a window
+        archive_after = await self.api.data.guild(guild).archive_after()
+        longest = timedelta(seconds=max(x["period"] for x in rules))
+        archived = archive_after is not None and timedelta(days=archive_after) < longest
+        for case in await self.api.get_all_cases(guild, member, archived=archived):
+            if case.get("escalation"):
+                # a previous escalation, its warnings must not be counted again
+                for rule in rules:
+                    if rule["action_level"] == case["level"] and rule["level"] in windows:
+                        windows[rule["level"]].clear()
+            window = windows.get(case["level"])
+            if window is None:
+                continue
+            try:
+                date = self.api._get_datetime(case["time"])
+            except (TypeError, ValueError):
+                continue
+            window.append(date)
+            if date >= time - RECENT:
+                recent[(case["level"], case["time"])] += 1
+        return windows, recent
+
+    async def add(
+        self,
+        guild: discord.Guild,
+        member: discord.Member,
+        level: int,
+        time: datetime,
+        rules: list,
+    ) -> Optional[dict]:
+        """
+        Record a new warning, already saved in the cases, and evaluate the rules.
+
+        Returns
+        -------
+        Optional[dict]
+            The triggered rule with the highest action level, if any. The window of the
+            level is then emptied, so the same warnings don't trigger it again.
+        """
+        key = (guild.id, member.id)
+        stamp = (level, time.strftime(TIME_FORMAT))
+        windows = self.windows.get(key)
+        while windows is None and key in self.loading:
+            # another warning of the member is loading the buffers
+            await asyncio.wait([self.loading[key]])
+            windows = self.windows.get(key)
+        if windows is None:
+            # the new case is already saved, loading includes it
+            self.loading[key] = asyncio.get_event_loop().create_future()
+            try:
+                windows, loaded = await self._load(guild, member, rules, time)
+            finally:
+                self.loading.pop(key).set_result(None)
+            self.windows[key] = windows
+            if len(self.windows) > self.max_members:
+                self.loaded.pop(self.windows.popitem(last=False)[0], None)
+            loaded[stamp] -= 1
+            self.loaded[key] = +loaded
+        else:
+            self.windows.move_to_end(key)
+            loaded = self.loaded.get(key)
+            if loaded and loaded[stamp] > 0:
+                # saved before the load of a concurrent warning, it's already in the window
+                loaded[stamp] -= 1
+            else:
+                window = windows.get(level)
+                if window is not None:
+                    window.append(time)
+        window = windows.get(level)
+        if not window:
+            return None
+        triggered = None
+        for rule in rules:
+            if rule["level"] != level:
+                continue
+            limit = time - timedelta(seconds=rule["period"])
+            if sum(1 for x in window if x >= limit) < rule["count"]:
+                continue
+            if triggered is None or rule["action_level"] > triggered["action_level"]:
+                triggered = rule
+        if triggered is not None:
+            window.clear()
+        return triggered
+
+    def forget(self, guild: discord.Guild):
+        """Drop the buffers of a guild, after its rules were modified."""
+        for key in [x for x in self.windows if x[0] == guild.id]:
+            del self.windows[key]
+            self.loaded.pop(key, None)
@@ -0,0 +1,137 @@
+import discord
+import logging
+
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Optional
+
+log = logging.getLogger("laggron.warnsystem")
+
+
+class InvitePool:
+    """
+    A pool of single-use invites, kept ready for each guild.
+
+    Building an embed with the ``{invite}`` key shouldn't wait for Discord, so a few invites
+    are created in advance, handed out one by one, and refilled in the background. Unused
+    invites are created with an expiration date, Discord deletes them by itself after that,
+    we only need to forget them a bit before.
+
+    Parameters
+    ----------
+    bot: redbot.core.bot.Red
+        The bot, used for scheduling the refill tasks.
+    size: int
+        The number of invites to keep ready for each guild.
+    max_age: int
+        The number of seconds before an unused invite expires.
+    """
+
+    def __init__(self, bot, size: int = 3, max_age: int = 86400):
+        self.bot = bot
+        self.size = size
+        self.max_age = max_age
+        # we stop handing out invites some time before they expire
+        self.margin = timedelta(seconds=max_age // 10)
+        self.invites = {}  # guild ID: deque of (invite, creation date)
+        self.tasks = {}  # guild ID: refill task
+
+    def _get_channel(self, guild: discord.Guild) -> Optional[discord.TextChannel]:
+        """Find a channel where the bot can create invites, following the guild's order."""
+        channels = [
+            x for x in guild.text_channels if x.permissions_for(guild.me).create_instant_invite
+        ]
+        if not channels:
+            return None
+        return sorted(channels, key=lambda x: x.position)[0]
+
+    def _is_valid(self, created_at: datetime, now: datetime) -> bool:
+        return now - created_at < timedelta(seconds=self.max_age) - self.margin
+
+    def get(self, guild: discord.Guild) -> Optional[discord.Invite]:
+        """
+        Take an invite from the pool of the guild, without waiting.
+
+        A refill is scheduled if the pool is running low.
+
+        Returns
+        -------
+        Optional[discord.Invite]
+            An unused invite, or :py:obj:`None` if the pool is empty.
+        """
+        pool = self.invites.get(guild.id)
+        invite = None
+        if pool:
+            now = datetime.utcnow()
+            while pool:
+                invite, created_at = pool.popleft()
+                if self._is_valid(created_at, now):
+                    break
+                invite = None
+        self.refill(guild)
+        return invite
+
+    def refill(self, guild: discord.Guild):
+        """Schedule a refill of the guild's pool, if one isn't already running."""
+        if len(self.invites.get(guild.id, ())) >= self.size:
+            return
+        task = self.tasks.get(guild.id)
+        if task and not task.done():
+            return
+        self.tasks[guild.id] = self.bot.loop.create_task(self._refill(guild))
+
+    async def _refill(self, guild: discord.Guild):
+        pool = self.invites.setdefault(guild.id, deque())
+        channel = self._get_channel(guild)
+        if channel is None:
+            log.debug(
+                f"Can't find a channel where I can create an invite in guild {guild} "
+                f"(ID: {guild.id}), invite pool will stay empty."
+            )
+            return
+        while len(pool) < self.size:
+            try:
+                invite = await channel.create_invite(
+                    max_uses=1,
+                    max_age=self.max_age,
+                    unique=True,
+                    reason="WarnSystem invite pool, used for the {invite} key of embeds.",
+                )
+            except discord.errors.HTTPException as e:
+                log.warn(
+                    f"Couldn't create an invite in guild {guild} (ID: {guild.id}) "
+                    "for the invite pool.",
+                    exc_info=e,
+                )
+                return
+            pool.append((invite, datetime.utcnow()))
+
+    def prune(self):
+        """
+        Forget the invites that are about to expire, and top up the pools.
+
+        This is called from the loop task.
+        """
+        now = datetime.utcnow()
+        for guild_id, pool in self.invites.items():
+            if not any(not self._is_valid(x[1], now) for x in pool):
+                continue
+            valid = [x for x in pool if self._is_valid(x[1], now)]
+            pool.clear()
+            pool.extend(valid)
+            guild = self.bot.get_guild(guild_id)
+            if guild:
+                self.refill(guild)
+
+    async def clear(self):
+        """Cancel the refills and delete the unused invites. Called on cog unload."""
+        for task in self.tasks.values():
+            task.cancel()
+        self.tasks = {}
+        invites = [x[0] for pool in self.invites.values() for x in pool]
+        self.invites = {}
+        for invite in invites:
+            try:
+                await invite.delete(reason="WarnSystem invite pool cleanup.")
+            except discord.errors.HTTPException:
+                pass  # already used or expired
@@ -0,0 +1,206 @@
+import math
+import time
+
+from collections import OrderedDict
+from contextlib import contextmanager
+
+# upper bounds of the histogram buckets, in seconds
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, math.inf)
+
+
+class Histogram:
+    """
+    Count observations in fixed buckets, like Prometheus does.
+
+    Percentiles are estimated from the buckets, so no observation is kept in memory.
+    """
+
+    type = "histogram"
+
+    def __init__(self, name: str, description: str):
+        self.name = name
+        self.description = description
+        self.buckets = [0] * len(BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.buckets[i] += 1
+                break
+
+    def quantile(self, q: float) -> float:
+        """Estimate a quantile (between 0 and 1) by interpolating inside its bucket."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, bound in enumerate(BUCKETS):
+            if seen + self.buckets[i] >= rank:
+                lower = BUCKETS[i - 1] if i else 0.0
+                upper = min(bound, self.max)
+                if upper <= lower:
+                    return upper
+                return lower + (upper - lower) * (rank - seen) / self.buckets[i]
+            seen += self.buckets[i]
+        return self.max
+
+    @property
+    def average(self) -> float:
+        return self.sum / self.count if self.count else 0.0
+
+    def to_prometheus(self, prefix: str) -> list:
+        name = f"{prefix}_{self.name}"
+        lines = []
+        total = 0
+        for bound, count in zip(BUCKETS, self.buckets):
+            total += count
+            le = "+Inf" if bound == math.inf else repr(bound)
+            lines.append(f'{name}_bucket{{le="{le}"}} {total}')
+        lines.append(f"{name}_sum {self.sum}")
+        lines.append(f"{name}_count {self.count}")
+        return lines
+
+
+class Counter:
+    type = "counter"
+
+    def __init__(self, name: str, description: str):
+        self.name = name
+        self.description = description
+        self.value = 0
+
+    def inc(self, amount: int = 1):
+        self.value += amount
+
+    def to_prometheus(self, prefix: str) -> list:
+        return [f"{prefix}_{self.name} {self.value}"]
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def set(self, value):
+        self.value = value
+
+
+class Stopwatch:
+    """Time the successive stages of an operation. See :meth:`MetricsRegistry.stopwatch`."""
+
+    def __init__(self, registry: "MetricsRegistry", name: str):
+        self.registry = registry
+        self.name = name
+        self.start = self.last = time.perf_counter()
+
+    def lap(self, stage: str):
+        """Record the time spent since the last lap as the given stage."""
+        now = time.perf_counter()
+        self.registry.observe(f"{self.name}_{stage}_seconds", now - self.last)
+        self.last = now
+
+    def stop(self):
+        """Record the total time of the operation."""
+        self.registry.observe(f"{self.name}_seconds", time.perf_counter() - self.start)
+
+
+class MetricsRegistry:
+    """
+    A lightweight registry of histograms, counters and gauges.
+
+    Metrics are created on first use, the descriptions are optional and only used
+    for the Prometheus export.
+    """
+
+    def __init__(self, prefix: str, descriptions: dict = None):
+        self.prefix = prefix
+        self.descriptions = descriptions or {}
+        self.metrics = OrderedDict()
+
+    def _get(self, cls, name: str):
+        metric = self.metrics.get(name)
+        if metric is None:
+            metric = cls(name, self.descriptions.get(name, name.replace("_", " ")))
+            self.metrics[name] = metric
+        return metric
+
+    def histogram(self, name: str) -> Histogram:
+        return self._get(Histogram, name)
+
+    def counter(self, name: str) -> Counter:
+        return self._get(Counter, name)
+
+    def gauge(self, name: str) -> Gauge:
+        return self._get(Gauge, name)
+
+    def observe(self, name: str, value: float):
+        self.histogram(name).observe(value)
+
+    def inc(self, name: str, amount: int = 1):
+        self.counter(name).inc(amount)
+
+    @contextmanager
+    def timer(self, name: str):
+        """Observe the duration of the block in the given histogram."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def stopwatch(self, name: str) -> Stopwatch:
+        """
+        Time each stage of an operation.
+
+        .. code-block:: python3
+
+            watch = metrics.stopwatch("warn")
+            ...
+            watch.lap("validation")  # observed in warn_validation_seconds
+            ...
+            watch.stop()  # total observed in warn_seconds
+        """
+        return Stopwatch(self, name)
+
+    def to_prometheus(self) -> str:
+        """Format all metrics with the Prometheus text exposition format."""
+        lines = []
+        for metric in self.metrics.values():
+            name = f"{self.prefix}_{metric.name}"
+            lines.append(f"# HELP {name} {metric.description}")
+            lines.append(f"# TYPE {name} {metric.type}")
+            lines.extend(metric.to_prometheus(self.prefix))
+        return "\n".join(lines) + "\n"
+
+
+class CountingDriver:
+    """
+    Wrap a Config driver to count the reads and writes in a registry.
+
+    Everything else is forwarded to the original driver.
+    """
+
+    def __init__(self, driver, registry: MetricsRegistry):
+        self.driver = driver
+        self.reads = registry.counter("config_reads_total")
+        self.writes = registry.counter("config_writes_total")
+
+    def __getattr__(self, name):
+        return getattr(self.driver, name)
+
+    async def get(self, *identifiers: str):
+        self.reads.inc()
+        return await self.driver.get(*identifiers)
+
+    async def set(self, *identifiers: str, value=None):
+        self.writes.inc()
+        return await self.driver.set(*identifiers, value=value)
+
+    async def clear(self, *identifiers: str):
+        self.writes.inc()
+        return await self.driver.clear(*identifiers)
@@ -11,8 +11,12 @@ from pathlib import Path
 from json import loads
 
 from redbot.core import commands, Config, checks
+from redbot.core.data_manager import cog_data_path
 from redbot.core.i18n import Translator, cog_i18n
 from redbot.core.utils import predicates, menus, mod
+from redbot.core.utils.chat_formatting import box, pagify
+
+from laggron_utils.cache import CachedDriver
 
 # from redbot.core.errors import BadArgument as RedBadArgument
 
@@ -21,6 +25,7 @@ _ = Translator("WarnSystem", __file__)
 
 from .api import API
 from . import errors
+from . import metrics
 
 if TYPE_CHECKING:
     from .loggers import Log
@@ -86,7 +91,7 @@ class WarnSystem(BaseCog):
     Full documentation and FAQ: http://laggron.red/warnsystem.html
     """
 
-    default_global = {"enable_sentry": None}
+    default_global = {"enable_sentry": None, "export_metrics": False}
     default_guild = {
         "delete_message": False,  # if the [p]warn commands should delete the context message
         "show_mod": False,  # if the responsible mod should be revealed to the warned user
@@ -137,8 +142,14 @@ class WarnSystem(BaseCog):
         },
         "url": None,  # URL set for the title of all embeds
         "temporary_warns": [],  # list of temporary warns (need to unmute/unban after some time)
+        "archive_after": None,  # number of days before moving the cases to the archive
+        "escalations": [],  # rules for automatically warning again with a higher level
+        "dedup_window": None,  # seconds where the same warning is only applied once
+    }
+    default_custom_member = {
+        "x": [],  # cannot set a list as base group
+        "archive": [],  # index of the archived cases, see warnsystem.archive
     }
-    default_custom_member = {"x": []}  # cannot set a list as base group
 
     def __init__(self, bot):
         self.bot = bot
@@ -149,6 +160,8 @@ class WarnSystem(BaseCog):
         self.data.register_custom("MODLOGS", **self.default_custom_member)
 
         self.api = API(bot, self.data)
+        # count the reads and writes of the config for [p]warnsystemstats, then cache them
+        self.data.driver = CachedDriver(metrics.CountingDriver(self.data.driver, self.api.metrics))
         self.errors = errors
         self.sentry = None
         self.translator = _
@@ -377,6 +390,7 @@ class WarnSystem(BaseCog):
         else:
             if not level:
                 await self.data.guild(guild).channels.main.set(channel.id)
+                self.api._invalidate_modlog_channels(guild)
                 await ctx.send(
                     _(
                         "Done. All events will be send to that channel by default.\n\nIf you want "
@@ -394,6 +408,7 @@ class WarnSystem(BaseCog):
                 )
             else:
                 await self.data.guild(guild).channels.set_raw(level, value=channel.id)
+                self.api._invalidate_modlog_channels(guild)
                 await ctx.send(
                     _(
                         "Done. All level {level} warnings events will be sent to that channel."
@@ -451,6 +466,7 @@ class WarnSystem(BaseCog):
             )
         else:
             await self.data.guild(guild).mute_role.set(role.id)
+            self.api._invalidate_capabilities(guild)
             await ctx.send(_("The new mute role was successfully set!"))
 
     @warnset.command(name="hierarchy")
@@ -478,6 +494,7 @@ class WarnSystem(BaseCog):
             )
         elif enable:
             await self.data.guild(guild).respect_hierarchy.set(True)
+            self.api._invalidate_capabilities(guild)
             await ctx.send(
                 _(
                     "Done. Moderators will not be able to take actions on the members higher "
@@ -486,6 +503,7 @@ class WarnSystem(BaseCog):
             )
         else:
             await self.data.guild(guild).respect_hierarchy.set(False)
+            self.api._invalidate_capabilities(guild)
             await ctx.send(
                 _(
                     "Done. Moderators will be able to take actions on anyone on the server, as "
@@ -525,6 +543,98 @@ class WarnSystem(BaseCog):
             await self.data.guild(guild).reinvite.set(False)
             await ctx.send(_("Done. The bot will no longer reinvite unbanned members."))
 
+    @warnset.command(name="archive")
+    async def warnset_archive(self, ctx: commands.Context, days: Union[int, str] = None):
+        """
+        Move the old cases to the archive.
+
+        Cases older than the given number of days are compressed and stored out of the \
+live modlog, which keeps warnings fast for members with a long history. They are still \
+shown with `[p]warnings`, but cannot be edited or deleted anymore.
+
+        Type `[p]warnset archive disable` to stop archiving cases.
+        Invoke the command without arguments to get the current status.
+        """
+        guild = ctx.guild
+        current = await self.data.guild(guild).archive_after()
+        if days is None:
+            if current is None:
+                await ctx.send(
+                    _(
+                        "Cases are not archived. If you want to change this, type "
+                        "`{prefix}warnset archive <days>`."
+                    ).format(prefix=ctx.prefix)
+                )
+            else:
+                await ctx.send(
+                    _("Cases older than {days} days are moved to the archive.").format(
+                        days=current
+                    )
+                )
+        elif days == "disable":
+            await self.data.guild(guild).archive_after.set(None)
+            await ctx.send(
+                _(
+                    "Done. Cases will no longer be archived. Cases already archived stay "
+                    "in the archive."
+                )
+            )
+        elif isinstance(days, str) or days < 1:
+            await ctx.send(_("The number of days must be a positive number, or `disable`."))
+        else:
+            await self.data.guild(guild).archive_after.set(days)
+            async with ctx.typing():
+                total = await self.api.archive_cases(guild)
+            await ctx.send(
+                _(
+                    "Done. Cases older than {days} days will be moved to the archive when a "
+                    "member is warned. {total} cases were archived now."
+                ).format(days=days, total=total)
+            )
+
+    @warnset.command(name="dedup")
+    async def warnset_dedup(self, ctx: commands.Context, seconds: Union[int, str] = None):
+        """
+        Ignore the duplicated warnings.
+
+        When several moderators or automod cogs warn the same member at the same time, only \
+the first warning is applied. Warnings with the same member, level and reason in the given \
+number of seconds are considered duplicated.
+
+        Type `[p]warnset dedup disable` to apply all warnings.
+        Invoke the command without arguments to get the current status.
+        """
+        guild = ctx.guild
+        current = await self.data.guild(guild).dedup_window()
+        if seconds is None:
+            if current is None:
+                await ctx.send(
+                    _(
+                        "Duplicated warnings are all applied. If you want to change this, type "
+                        "`{prefix}warnset dedup <seconds>`."
+                    ).format(prefix=ctx.prefix)
+                )
+            else:
+                await ctx.send(
+                    _(
+                        "Warnings with the same member, level and reason in {seconds} seconds "
+                        "are only applied once."
+                    ).format(seconds=current)
+                )
+        elif seconds == "disable":
+            await self.data.guild(guild).dedup_window.set(None)
+            await ctx.send(_("Done. Duplicated warnings will all be applied."))
+        elif isinstance(seconds, str) or not 1 <= seconds <= 3600:
+            await ctx.send(_("The number of seconds must be between 1 and 3600, or `disable`."))
+        else:
+            await self.data.guild(guild).dedup_window.set(seconds)
+            await ctx.send(
+                _(
+                    "Done. Warnings with the same member, level and reason in {seconds} seconds "
+                    "will only be applied once."
+                ).format(seconds=seconds)
+            )
+
     @warnset.command("bandays")
     async def warnset_bandays(self, ctx: commands.Context, ban_type: str, days: int):
         """
@@ -678,6 +788,130 @@ class WarnSystem(BaseCog):
             embeds.append(embed)
         await menus.menu(ctx, embeds, controls=menus.DEFAULT_CONTROLS)
 
+    @warnset.group(name="escalation")
+    async def warnset_escalation(self, ctx: commands.Context):
+        """
+        Manage the automatic escalation rules.
+
+        An escalation rule warns a member again with a higher level when they receive too many\
+        warnings of the same level in a given time.
+
+        For example, you can mute for one hour the members receiving 3 level 1 warnings in 7 days.
+        """
+        pass
+
+    @warnset_escalation.command(name="add")
+    async def warnset_escalation_add(
+        self,
+        ctx: commands.Context,
+        level: int,
+        count: int,
+        period: str,
+        action_level: int,
+        duration: str = None,
+    ):
+        """
+        Create a new escalation rule.
+
+        `level` is the level of the counted warnings
+        `count` is the number of warnings that triggers the rule
+        `period` is the time where the warnings are counted, such as `7d` or `12h` (no spaces)
+        `action_level` is the level of the warning given by the rule, higher than `level`
+        `duration` is optional, for a temporary mute or ban
+
+        Example:
+        - `[p]warnset escalation add 1 3 7d 2 1h`
+        Members receiving 3 level 1 warnings in 7 days will be muted for one hour.
+        """
+        if not 1 <= level <= 5 or not 1 <= action_level <= 5:
+            await ctx.send(_("The levels must be between 1 and 5."))
+            return
+        if action_level <= level:
+            await ctx.send(_("The level of the action must be higher than the counted level."))
+            return
+        if count < 1:
+            await ctx.send(_("The number of warnings must be positive."))
+            return
+        try:
+            period = timedelta_converter(period)
+            duration = timedelta_converter(duration) if duration else None
+        except RedBadArgument:
+            await ctx.send(_("Invalid time format. Examples of valid times: `7d`, `12h`, `30m`"))
+            return
+        if duration and action_level not in (2, 5):
+            await ctx.send(_("Only a mute or a ban can be temporary."))
+            return
+        async with self.data.guild(ctx.guild).escalations() as escalations:
+            escalations.append(
+                {
+                    "level": level,
+                    "count": count,
+                    "period": int(period.total_seconds()),
+                    "action_level": action_level,
+                    "duration": int(duration.total_seconds()) if duration else None,
+                }
+            )
+        self.api.escalations.forget(ctx.guild)
+        await ctx.send(
+            _(
+                "The escalation rule was successfully created! See the existing rules with "
+                "`{prefix}warnset escalation list`."
+            ).format(prefix=ctx.prefix)
+        )
+
+    @warnset_escalation.command(name="delete", aliases=["del"])
+    async def warnset_escalation_delete(self, ctx: commands.Context, index: int):
+        """
+        Delete an escalation rule.
+
+        `index` is the number of the rule, shown by `[p]warnset escalation list`.
+        """
+        async with self.data.guild(ctx.guild).escalations() as escalations:
+            if not 0 < index <= len(escalations):
+                await ctx.send(
+                    _(
+                        "That rule doesn't exist!\nSee existing rules with the "
+                        "`{prefix}warnset escalation list` command."
+                    ).format(prefix=ctx.prefix)
+                )
+                return
+            del escalations[index - 1]
+        self.api.escalations.forget(ctx.guild)
+        await ctx.send(_("The escalation rule was successfully deleted."))
+
+    @warnset_escalation.command(name="list")
+    async def warnset_escalation_list(self, ctx: commands.Context):
+        """
+        List all escalation rules on your server.
+        """
+        escalations = await self.data.guild(ctx.guild).escalations()
+        if not escalations:
+            await ctx.send(
+                _(
+                    "You don't have any escalation rule on this server!\n"
+                    "Create one with `{prefix}warnset escalation add`"
+                ).format(prefix=ctx.prefix)
+            )
+            return
+        rules = []
+        for i, rule in enumerate(escalations, start=1):
+            text = _(
+                "{index}. {count} level {level} warnings in {period} → level {action_level}"
+            ).format(
+                index=i,
+                count=rule["count"],
+                level=rule["level"],
+                period=self.api._format_timedelta(timedelta(seconds=rule["period"])),
+                action_level=rule["action_level"],
+            )
+            if rule["duration"]:
+                text += _(" for {duration}").format(
+                    duration=self.api._format_timedelta(timedelta(seconds=rule["duration"]))
+                )
+            rules.append(text)
+        for page in pagify("\n".join(rules)):
+            await ctx.send(page)
+
     @warnset.command(name="showmod")
     async def warnset_showmod(self, ctx, enable: bool = None):
         """
@@ -759,6 +993,8 @@ class WarnSystem(BaseCog):
         await self.data.guild(guild).set_raw(
             "embed_description_" + destination, str(level), value=description
         )
+        if "{invite}" in description:
+            self.api.invites.refill(guild)
         await ctx.send(
             _("The new description for {destination} (warn {level}) was successfully set!").format(
                 destination=_("modlog") if destination == "modlog" else _("user"), level=level
@@ -891,6 +1127,7 @@ class WarnSystem(BaseCog):
         elif pred.result == 1:
             await ctx.send(_("Deleting server logs... Settings, such as channels, are kept."))
             await self.data.custom("MODLOGS").set({})
+            await self.api.archive.clear()
             await ctx.send(_("Starting conversion... This might take a long time."))
             total = await convert(guild_id, content)
         t2 = time.time()
@@ -1076,6 +1313,9 @@ class WarnSystem(BaseCog):
             await ctx.send(_("You are not allowed to see other's warnings!"))
             return
         cases = await self.api.get_all_cases(ctx.guild, user)
+        archived = self.api._count_archived(
+            await self.data.custom("MODLOGS", ctx.guild.id, user.id).all()
+        )
         if not cases:
             await ctx.send(_("That member was never warned."))
             return
@@ -1110,9 +1350,11 @@ class WarnSystem(BaseCog):
             moderator = ctx.guild.get_member(case["author"])
             moderator = "ID: " + str(case["author"]) if not moderator else moderator.mention
 
-            embed = discord.Embed(
-                description=_("Case #{number} informations").format(number=i + 1)
-            )
+            if i < archived:
+                description = _("Case #{number} informations (archived)")
+            else:
+                description = _("Case #{number} informations")
+            embed = discord.Embed(description=description.format(number=i + 1))
             embed.set_author(name=f"{user} | {user.id}", icon_url=user.avatar_url)
             embed.add_field(
                 name=_("Level"), value=f"{warning_str(level, False)} ({level})", inline=True
@@ -1164,12 +1406,19 @@ class WarnSystem(BaseCog):
         member = await self.api._get_user_info(
             int(embed.author.name.rpartition("|")[2].replace(" ", ""))
         )
+        member_data = await self.data.custom("MODLOGS", guild.id, member.id).all()
+        archived = self.api._count_archived(member_data)
+        if page <= archived:
+            await message.edit(
+                content=_("This case is archived, it cannot be edited."), embed=None
+            )
+            return
         embed.clear_fields()
         embed.description = _(
             "Case #{number} edition.\n\n**Please type the new reason to set**"
         ).format(number=page)
         embed.set_footer(text=_("You have two minutes to type your text in the chat."))
-        case = (await self.data.custom("MODLOGS", guild.id, member.id).x())[page - 1]
+        case = member_data["x"][page - archived - 1]
         await message.edit(embed=embed)
         try:
             response = await self.bot.wait_for(
@@ -1194,7 +1443,7 @@ class WarnSystem(BaseCog):
             return
         if pred.result:
             async with self.data.custom("MODLOGS", guild.id, member.id).x() as logs:
-                logs[page - 1]["reason"] = new_reason
+                logs[page - archived - 1]["reason"] = new_reason
             await message.clear_reactions()
             await message.edit(content=_("The reason was successfully edited!"), embed=None)
         else:
@@ -1225,6 +1474,14 @@ class WarnSystem(BaseCog):
         member = await self.api._get_user_info(
             int(embed.author.name.rpartition("|")[2].replace(" ", ""))
         )
+        archived = self.api._count_archived(
+            await self.data.custom("MODLOGS", guild.id, member.id).all()
+        )
+        if page <= archived:
+            await message.edit(
+                content=_("This case is archived, it cannot be deleted."), embed=None
+            )
+            return
         embed.clear_fields()
         embed.set_footer(text="")
         embed.description = _(
@@ -1241,7 +1498,7 @@ class WarnSystem(BaseCog):
             return
         if pred.result:
             async with self.data.custom("MODLOGS", guild.id, member.id).x() as logs:
-                logs.remove(logs[page - 1])
+                logs.remove(logs[page - archived - 1])
             await message.clear_reactions()
             await message.edit(content=_("The case was successfully deleted!"), embed=None)
         else:
@@ -1309,10 +1566,80 @@ class WarnSystem(BaseCog):
         ).format(self, status(current_status), ctx.prefix)
         await ctx.send(message)
 
-    # error handling
-    def _set_context(self, data):
-        self.sentry.client.extra_context(data)
+    @commands.command(hidden=True)
+    @checks.is_owner()
+    async def warnsystemstats(self, ctx, export: str = None):
+        """
+        Show the latency of the cog's operations since it was loaded.
+
+        Type `export` after your command to toggle the export of the metrics in a file, \
+readable by Prometheus.
+        """
+        if export is not None and "export" in export:
+            current = await self.data.export_metrics()
+            await self.data.export_metrics.set(not current)
+            if current:
+                await ctx.send(_("The metrics won't be exported anymore."))
+            else:
+                path = cog_data_path(raw_name="WarnSystem") / "metrics.prom"
+                await ctx.send(
+                    _(
+                        "The metrics will now be written every 10 seconds in the following "
+                        "file:\n`{path}`"
+                    ).format(path=path)
+                )
+            return
+        self.api._update_cache_metrics()
+        histograms = []
+        others = []
+        for metric in self.api.metrics.metrics.values():
+            if isinstance(metric, metrics.Histogram):
+                if not metric.count:
+                    continue
+                histograms.append(
+                    f"{metric.name[:-8]:<28} {metric.count:>7} "
+                    f"{metric.average * 1000:>9.1f} {metric.quantile(0.5) * 1000:>9.1f} "
+                    f"{metric.quantile(0.99) * 1000:>9.1f} {metric.max * 1000:>9.1f}"
+                )
+            else:
+                others.append(f"{metric.name:<28} {metric.value:>7}")
+        if not histograms and not others:
+            await ctx.send(_("Nothing was measured yet."))
+            return
+        text = ""
+        if histograms:
+            text += (
+                f"{_('operation'):<28} {_('count'):>7} {_('avg (ms)'):>9} "
+                f"{_('p50 (ms)'):>9} {_('p99 (ms)'):>9} {_('max (ms)'):>9}\n"
+            )
+            text += "\n".join(histograms) + "\n\n"
+        text += "\n".join(others)
+        for page in pagify(text, page_length=1980):
+            await ctx.send(box(page))
+
+    # the bot's capabilities on a guild must be checked again after these events
+    async def on_guild_role_update(self, before: discord.Role, after: discord.Role):
+        self.api._invalidate_capabilities(after.guild)
 
+    async def on_guild_role_delete(self, role: discord.Role):
+        self.api._invalidate_capabilities(role.guild)
+
+    async def on_guild_channel_update(self, before, after):
+        self.api._invalidate_capabilities(after.guild, after)
+
+    async def on_guild_channel_delete(self, channel):
+        self.api._invalidate_capabilities(channel.guild, channel)
+        self.api._invalidate_modlog_channels(channel.guild)
+
+    async def on_member_update(self, before: discord.Member, after: discord.Member):
+        if after == after.guild.me:
+            self.api._invalidate_capabilities(after.guild)
+
+    async def on_guild_remove(self, guild: discord.Guild):
+        self.api._invalidate_capabilities(guild)
+        self.api._invalidate_modlog_channels(guild)
+
+    # error handling
     async def on_command_error(self, ctx, error):
         if not isinstance(error, commands.CommandInvokeError):
             return
@@ -1335,13 +1662,13 @@ class WarnSystem(BaseCog):
         }
         if ctx.guild:
             context["guild"] = f"{ctx.guild.name} (ID: {ctx.guild.id})"
-        self._set_context(context)
-        self.sentry.disable_stdout()  # remove console output since red also handle this
+        # the context is attached to this record only, and the console output is skipped
+        # since Red already handles this
         log.error(
-            f"Exception in command '{ctx.command.qualified_name}'.\n\n", exc_info=error.original
+            f"Exception in command '{ctx.command.qualified_name}'.\n\n",
+            exc_info=error.original,
+            extra={"data": context, "no_stdout": True},
         )
-        self.sentry.enable_stdout()  # re-enable console output for warnings
-        self._set_context({})  # remove context for future logs
 
     # correctly unload the cog
     def __unload(self):
@@ -1349,7 +1676,13 @@ class WarnSystem(BaseCog):
 
         # remove all handlers from the logger, this prevents adding
         # multiple times the same handler if the cog gets reloaded
+        self.sentry.disable()
         log.handlers = []
+        self.sentry.stop_file_logging()
+        self.data.driver.schedule_close()
 
         # stop checking for unmute and unban
         self.task.cancel()
+
+        # delete the invites prepared and not used
+        self.bot.loop.create_task(self.api.invites.clear())